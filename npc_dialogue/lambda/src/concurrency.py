@@ -0,0 +1,294 @@
+"""
+Concurrency Module
+Idempotency keys, single-flight request coalescing and per-conversation ordering
+
+- IdempotencyStore keeps the result of a request under its idempotency key
+  for a short time, so a client retry is answered from the stored result
+  instead of another Bedrock call and history row.
+- SingleFlight lets identical requests that are in flight in the same
+  process (worker pool threads, local server) share one execution.
+- ConversationSequencer numbers the turns of each game_id#character_id
+  conversation. A turn is only recorded if no other turn was recorded since
+  it read the history (optimistic concurrency on a head record).
+- ThreadLocalTable gives each thread its own boto3 Table, since boto3
+  resources must not be shared between threads.
+
+All records live in the chat history table under their own partition keys,
+so they never show up in conversation history queries.
+"""
+
+import hashlib
+import json
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import boto3
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+
+class IdempotencyInProgressError(Exception):
+    """A request with the same idempotency key is still being processed"""
+
+
+class IdempotencyKeyReuseError(Exception):
+    """An idempotency key was sent again with a different request"""
+
+
+class ConversationConflictError(Exception):
+    """Another turn was recorded for the conversation since this one read its history"""
+
+
+def request_fingerprint(payload: Dict) -> str:
+    """Stable hash of a request payload"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _is_conditional_failure(error: ClientError) -> bool:
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+class ThreadLocalTable:
+    """
+    DynamoDB Table that can be shared between threads
+
+    Each thread lazily builds its own session and resource; attribute access
+    (put_item, query, meta.client, ...) goes to the calling thread's Table.
+    """
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+        self._local = threading.local()
+
+    def _table(self):
+        table = getattr(self._local, 'table', None)
+        if table is None:
+            table = boto3.session.Session().resource('dynamodb').Table(self.table_name)
+            self._local.table = table
+        return table
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._table(), name)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Dict] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn, or wait for the identical call already in flight and share its outcome
+
+        Raises:
+            Exception: Whatever the shared execution raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            logger.info(f"Joining in-flight request {key[:12]}")
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+
+class IdempotencyStore:
+    """
+    Results stored under client idempotency keys
+
+    Args:
+        table: The chat history DynamoDB table
+        ttl_seconds: How long a completed result is replayed
+        in_progress_seconds: How long an unfinished claim blocks retries (e.g. after a crash)
+    """
+
+    def __init__(self, table, ttl_seconds: int = 300, in_progress_seconds: int = 60):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.in_progress_seconds = in_progress_seconds
+
+    def _key(self, scope: str, idempotency_key: str) -> Dict:
+        return {
+            'composite_key': f"{scope}#idempotency#{idempotency_key}",
+            'timestamp': 'result'
+        }
+
+    def begin(self, scope: str, idempotency_key: str, fingerprint: str) -> Optional[Dict]:
+        """
+        Claim an idempotency key for a new request
+
+        Returns:
+            The stored result if this key already completed, otherwise None (claimed)
+
+        Raises:
+            IdempotencyInProgressError: The original request is still running
+            IdempotencyKeyReuseError: The key was used for a different request
+        """
+        now = int(datetime.utcnow().timestamp())
+        try:
+            self.table.put_item(
+                Item={
+                    **self._key(scope, idempotency_key),
+                    'status': 'in_progress',
+                    'fingerprint': fingerprint,
+                    'expires_at': now + self.in_progress_seconds,
+                    'ttl': now + self.ttl_seconds
+                },
+                ConditionExpression='attribute_not_exists(composite_key) OR expires_at < :now',
+                ExpressionAttributeValues={':now': now}
+            )
+            return None
+        except ClientError as e:
+            if not _is_conditional_failure(e):
+                raise
+
+        item = self.table.get_item(
+            Key=self._key(scope, idempotency_key),
+            ConsistentRead=True
+        ).get('Item', {})
+        if item.get('fingerprint') != fingerprint:
+            raise IdempotencyKeyReuseError(
+                f"Idempotency key {idempotency_key} was already used for a different request"
+            )
+        if item.get('status') == 'completed':
+            logger.info(f"Replaying stored result for idempotency key {idempotency_key}")
+            return json.loads(item['result'])
+        raise IdempotencyInProgressError(f"Request {idempotency_key} is still in progress")
+
+    def complete(self, scope: str, idempotency_key: str, fingerprint: str, result: Dict):
+        now = int(datetime.utcnow().timestamp())
+        self.table.put_item(Item={
+            **self._key(scope, idempotency_key),
+            'status': 'completed',
+            'fingerprint': fingerprint,
+            'result': json.dumps(result),
+            'expires_at': now + self.ttl_seconds,
+            'ttl': now + self.ttl_seconds
+        })
+
+    def release(self, scope: str, idempotency_key: str):
+        """Drop a claim after a failure so the client's retry runs again"""
+        try:
+            self.table.delete_item(Key=self._key(scope, idempotency_key))
+        except Exception as e:
+            logger.warning(f"Error releasing idempotency key {idempotency_key}: {str(e)}")
+
+
+class ConversationSequencer:
+    """
+    Turn counter per conversation, advanced with conditional writes
+
+    Args:
+        table: The chat history DynamoDB table
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def _key(self, composite_key: str) -> Dict:
+        return {'composite_key': f"{composite_key}#head", 'timestamp': 'head'}
+
+    def current_turn(self, composite_key: str) -> int:
+        """Number of turns recorded so far for the conversation"""
+        item = self.table.get_item(Key=self._key(composite_key), ConsistentRead=True).get('Item')
+        return int(item['turn']) if item else 0
+
+    def record_turn(self, composite_key: str, expected_turn: int, item: Dict) -> int:
+        """
+        Write a history item as the next turn if the conversation is still at expected_turn
+
+        The head update and the history put happen in one transaction, so a turn
+        number is never taken without its history row or the other way round.
+
+        Returns:
+            The new turn number
+
+        Raises:
+            ConversationConflictError: Another turn was recorded in the meantime
+        """
+        return self.record_turns([(composite_key, expected_turn, item)])[0]
+
+    def record_turns(self, turns: List[Tuple[str, int, Dict]]) -> List[int]:
+        """
+        Record turns of several conversations at once (a group scene), all or none
+
+        Args:
+            turns: (composite_key, expected_turn, item) per conversation
+
+        Returns:
+            The new turn numbers, in order
+
+        Raises:
+            ConversationConflictError: Any of the conversations moved on in the meantime
+        """
+        now = datetime.utcnow().isoformat()
+        transact_items = []
+        for composite_key, expected_turn, item in turns:
+            if expected_turn == 0:
+                condition = 'attribute_not_exists(turn)'
+                values = {}
+            else:
+                condition = 'turn = :expected'
+                values = {':expected': expected_turn}
+            values.update({':next': expected_turn + 1, ':updated': now})
+            update = {
+                'TableName': self.table.name,
+                'Key': self._key(composite_key),
+                'UpdateExpression': 'SET turn = :next, updated_at = :updated',
+                'ConditionExpression': condition,
+                'ExpressionAttributeValues': values
+            }
+            if 'ttl' in item:
+                # The head expires with the newest row it indexes
+                update['UpdateExpression'] += ', #ttl = :ttl'
+                update['ExpressionAttributeNames'] = {'#ttl': 'ttl'}
+                values[':ttl'] = item['ttl']
+
+            # The resource's client serializes plain Python values like Table does
+            transact_items.extend([
+                {'Update': update},
+                {
+                    'Put': {
+                        'TableName': self.table.name,
+                        'Item': {**item, 'turn': expected_turn + 1}
+                    }
+                }
+            ])
+
+        try:
+            self.table.meta.client.transact_write_items(TransactItems=transact_items)
+            return [expected_turn + 1 for _, expected_turn, _ in turns]
+        except ClientError as e:
+            reasons = e.response.get('CancellationReasons', [])
+            # Head updates are the even entries; only they carry conditions
+            conflicted = [
+                turns[i // 2][0] for i, reason in enumerate(reasons)
+                if reason.get('Code') == 'ConditionalCheckFailed'
+            ]
+            if conflicted:
+                raise ConversationConflictError(
+                    f"{', '.join(conflicted)} moved on since the turn was read"
+                )
+            raise
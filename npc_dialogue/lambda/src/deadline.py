@@ -0,0 +1,185 @@
+"""
+Deadline Module
+Tracks a request's time budget and sheds optional work as it runs out
+
+The budget is the smallest of:
+- the Lambda's remaining time (context.get_remaining_time_in_millis())
+- the API Gateway integration timeout
+- the client's own budget, sent as `X-Request-Deadline-Ms`
+less a safety margin for serializing and returning the response.
+
+Each stage of a turn asks the deadline what it can afford. From the first
+stage shed to the last:
+- below DEADLINE_HISTORY_MS: skip the conversation history and world digest reads
+- below DEADLINE_BACKGROUND_MS: half the NPC knowledge token budget
+- below DEADLINE_GENERATION_MS: lower max_tokens
+- below DEADLINE_FAST_MODEL_MS: switch to FAST_MODEL_ID (if set) with fewer tokens
+- below DEADLINE_WRITE_MS: defer the history write to the job worker
+- below DEADLINE_MIN_MS: give up before calling the model (503)
+
+Shed steps are recorded on the deadline, stored with the turn's metrics and
+emitted as a DegradedResponses CloudWatch metric.
+"""
+
+import os
+import time
+from typing import List, Optional, Tuple
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import MetricUnit, single_metric
+
+logger = Logger()
+
+DEADLINE_HEADER = 'X-Request-Deadline-Ms'
+API_GATEWAY_TIMEOUT_MS = 29000
+METRICS_NAMESPACE = os.environ.get('POWERTOOLS_METRICS_NAMESPACE', 'NPCDialogue')
+
+
+def _env_ms(name: str, default: int) -> int:
+    return int(os.environ.get(name, str(default)))
+
+
+class DeadlineExceededError(Exception):
+    """Too little time is left to generate a response"""
+
+
+class DegradationPolicy:
+    """
+    Remaining-time thresholds (ms) at which each optional stage is shed
+
+    Args:
+        safety_ms: Reserved for returning the response
+        history_ms: Below this, history and world digest are not read
+        background_ms: Below this, the knowledge token budget is halved
+        generation_ms: Below this, max_tokens is lowered
+        fast_model_ms: Below this, the fast model is used
+        write_ms: Below this after generation, the history write is deferred
+        min_ms: Below this before generation, the request is abandoned
+        reduced_max_tokens: max_tokens below generation_ms
+        fast_max_tokens: max_tokens below fast_model_ms
+        fast_model_id: Model used below fast_model_ms; None keeps the default model
+    """
+
+    def __init__(self, safety_ms: int = 1000, history_ms: int = 15000,
+                 background_ms: int = 12000, generation_ms: int = 10000,
+                 fast_model_ms: int = 6000, write_ms: int = 3000, min_ms: int = 1500,
+                 reduced_max_tokens: int = 250, fast_max_tokens: int = 150,
+                 fast_model_id: Optional[str] = None):
+        self.safety_ms = safety_ms
+        self.history_ms = history_ms
+        self.background_ms = background_ms
+        self.generation_ms = generation_ms
+        self.fast_model_ms = fast_model_ms
+        self.write_ms = write_ms
+        self.min_ms = min_ms
+        self.reduced_max_tokens = reduced_max_tokens
+        self.fast_max_tokens = fast_max_tokens
+        self.fast_model_id = fast_model_id or None
+
+    @classmethod
+    def from_env(cls) -> 'DegradationPolicy':
+        return cls(
+            safety_ms=_env_ms('DEADLINE_SAFETY_MS', 1000),
+            history_ms=_env_ms('DEADLINE_HISTORY_MS', 15000),
+            background_ms=_env_ms('DEADLINE_BACKGROUND_MS', 12000),
+            generation_ms=_env_ms('DEADLINE_GENERATION_MS', 10000),
+            fast_model_ms=_env_ms('DEADLINE_FAST_MODEL_MS', 6000),
+            write_ms=_env_ms('DEADLINE_WRITE_MS', 3000),
+            min_ms=_env_ms('DEADLINE_MIN_MS', 1500),
+            fast_model_id=os.environ.get('FAST_MODEL_ID')
+        )
+
+
+policy = DegradationPolicy.from_env()
+
+
+class Deadline:
+    """
+    The time budget of one request and the stages it shed
+
+    Args:
+        budget_ms: Time available from now; None for no deadline (nothing is shed)
+        degradation: Thresholds to apply; defaults to the environment's policy
+    """
+
+    def __init__(self, budget_ms: Optional[float] = None,
+                 degradation: Optional[DegradationPolicy] = None):
+        self.policy = degradation or policy
+        self.budget_ms = budget_ms
+        self.expires_at = None if budget_ms is None else time.monotonic() + budget_ms / 1000
+        self.shed: List[str] = []
+
+    @classmethod
+    def for_request(cls, lambda_context=None, client_budget_ms: Optional[str] = None) -> 'Deadline':
+        """Deadline of an API request from the Lambda context and the client header"""
+        budgets = [API_GATEWAY_TIMEOUT_MS]
+        if lambda_context is not None and hasattr(lambda_context, 'get_remaining_time_in_millis'):
+            budgets.append(lambda_context.get_remaining_time_in_millis())
+        if client_budget_ms:
+            try:
+                budgets.append(max(float(client_budget_ms), 0))
+            except ValueError:
+                logger.warning(f"Ignoring invalid {DEADLINE_HEADER}: {client_budget_ms}")
+        return cls(min(budgets) - policy.safety_ms)
+
+    @classmethod
+    def unbounded(cls) -> 'Deadline':
+        """No deadline, e.g. for queued jobs"""
+        return cls(None)
+
+    def remaining_ms(self) -> float:
+        if self.expires_at is None:
+            return float('inf')
+        return (self.expires_at - time.monotonic()) * 1000
+
+    def _below(self, threshold_ms: int, step: str) -> bool:
+        if self.remaining_ms() >= threshold_ms:
+            return False
+        if step not in self.shed:
+            self.shed.append(step)
+            logger.info(f"Shedding {step} with {int(self.remaining_ms())} ms left")
+        return True
+
+    def skip_history(self) -> bool:
+        return self._below(self.policy.history_ms, 'history')
+
+    def knowledge_budget(self, token_budget: int) -> int:
+        if self._below(self.policy.background_ms, 'background'):
+            return max(token_budget // 2, 100)
+        return token_budget
+
+    def generation(self, model_id: str, max_tokens: int) -> Tuple[str, int]:
+        """
+        Model and max_tokens affordable for the model call
+
+        Raises:
+            DeadlineExceededError: Not even a short response fits in the time left
+        """
+        remaining = self.remaining_ms()
+        if remaining < self.policy.min_ms:
+            raise DeadlineExceededError(f"Only {int(remaining)} ms left for generation")
+        if self.policy.fast_model_id and self._below(self.policy.fast_model_ms, 'fast_model'):
+            return self.policy.fast_model_id, min(max_tokens, self.policy.fast_max_tokens)
+        if self._below(self.policy.fast_model_ms, 'short_response'):
+            return model_id, min(max_tokens, self.policy.fast_max_tokens)
+        if self._below(self.policy.generation_ms, 'max_tokens'):
+            return model_id, min(max_tokens, self.policy.reduced_max_tokens)
+        return model_id, max_tokens
+
+    def defer_write(self) -> bool:
+        return self._below(self.policy.write_ms, 'deferred_write')
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.shed)
+
+    def report(self, route: str):
+        """Emit the DegradedResponses metric if any stage was shed"""
+        if not self.shed:
+            return
+        try:
+            with single_metric(name='DegradedResponses', unit=MetricUnit.Count, value=1,
+                               namespace=METRICS_NAMESPACE) as metric:
+                metric.add_dimension(name='route', value=route)
+                metric.add_metadata(key='shed', value=','.join(self.shed))
+        except Exception as e:
+            logger.warning(f"Error emitting degradation metric: {str(e)}")
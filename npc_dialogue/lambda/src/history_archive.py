@@ -0,0 +1,360 @@
+"""
+History Archive Module
+Moves old chat history from DynamoDB to compressed files and reads it back
+
+Turns leave the hot table two ways:
+- TTL expiry: the table stream delivers the expired item (OLD_IMAGE) to stream_handler
+- Periodic sweep: sweep_handler archives and deletes turns older than
+  ARCHIVE_AFTER_DAYS, keeping the most recent turns of each conversation hot
+
+Archived turns are written as gzip-compressed JSON Lines, partitioned by
+game, character and date, to S3 (ARCHIVE_BUCKET) or to a local directory
+(ARCHIVE_ROOT) during development. Each part has a small manifest under
+the conversation's _index/ prefix with its time range, so reads only open
+the parts they need.
+
+Manifests are written once and never updated, so the sweep and the stream
+handler can archive the same conversation at the same time without losing
+each other's parts. Part and manifest keys are derived from the part's time
+range and size, which makes a redelivered batch rewrite the same objects.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+logger = Logger()
+
+DEFAULT_ARCHIVE_ROOT = '/tmp/npc_history_archive'
+TTL_PRINCIPAL = 'dynamodb.amazonaws.com'
+
+ARCHIVED_FIELDS = ['composite_key', 'timestamp', 'game_id', 'character_id', 'turn',
+                   'context', 'response', 'metrics']
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+class LocalArchiveStorage:
+    """Archive files in a local directory; stands in for S3 during development"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, key: str, data: bytes):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)  # Readers never see a partial file
+
+    def list(self, prefix: str) -> List[str]:
+        """Keys under a prefix, at any depth like an S3 listing"""
+        directory = os.path.join(self.root, prefix)
+        keys = []
+        for path, _, names in os.walk(directory):
+            keys.extend(
+                os.path.relpath(os.path.join(path, name), self.root).replace(os.sep, '/')
+                for name in names if not name.endswith('.tmp')
+            )
+        return sorted(keys)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.root, key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class S3ArchiveStorage:
+    """Archive files in an S3 bucket"""
+
+    def __init__(self, bucket: str, s3=None):
+        self.s3 = s3 or boto3.client('s3')
+        self.bucket = bucket
+
+    def put(self, key: str, data: bytes):
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{prefix}/" if prefix else ''):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return sorted(keys)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+
+
+def create_archive_storage():
+    """S3 when ARCHIVE_BUCKET is set, otherwise the local ARCHIVE_ROOT directory"""
+    if os.environ.get('ARCHIVE_BUCKET'):
+        return S3ArchiveStorage(os.environ['ARCHIVE_BUCKET'])
+    return LocalArchiveStorage(os.environ.get('ARCHIVE_ROOT', DEFAULT_ARCHIVE_ROOT))
+
+
+def is_conversation_item(item: Dict) -> bool:
+    """True for chat turns; digest, head, prefetch and idempotency records are skipped"""
+    return 'game_id' in item and 'character_id' in item and \
+        item.get('composite_key') == f"{item['game_id']}#{item['character_id']}"
+
+
+class HistoryArchive:
+    """
+    Writes and reads archived conversation turns
+
+    Args:
+        storage: LocalArchiveStorage or S3ArchiveStorage
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def _prefix(game_id: str, character_id: str) -> str:
+        return f"game_id={game_id}/character_id={character_id}"
+
+    @staticmethod
+    def _compact(timestamp: str) -> str:
+        return timestamp.replace(':', '')
+
+    def _manifest_keys(self, game_id: str, character_id: str) -> List[str]:
+        """Manifest keys, in order of their parts' max timestamp"""
+        return self.storage.list(f"{self._prefix(game_id, character_id)}/_index")
+
+    def _parts_newest_first(self, game_id: str, character_id: str):
+        """Yield part descriptions by descending max timestamp, reading manifests lazily"""
+        for key in reversed(self._manifest_keys(game_id, character_id)):
+            data = self.storage.get(key)
+            if data is None:
+                continue
+            yield json.loads(data)
+
+    def write(self, items: List[Dict]) -> int:
+        """
+        Archive chat turns, one part file per conversation and date
+
+        Returns:
+            Number of turns written
+        """
+        groups: Dict[tuple, List[Dict]] = defaultdict(list)
+        for item in items:
+            if is_conversation_item(item):
+                groups[(item['game_id'], item['character_id'])].append(item)
+
+        written = 0
+        for (game_id, character_id), turns in groups.items():
+            prefix = self._prefix(game_id, character_id)
+            known_manifests = set(self._manifest_keys(game_id, character_id))
+
+            by_date: Dict[str, List[Dict]] = defaultdict(list)
+            for turn in turns:
+                by_date[turn['timestamp'][:10]].append(turn)
+
+            for date, part_turns in sorted(by_date.items()):
+                part_turns.sort(key=lambda turn: turn['timestamp'])
+                summary = (part_turns[0]['timestamp'], part_turns[-1]['timestamp'],
+                           len(part_turns))
+                digest = hashlib.sha256(json.dumps(summary).encode('utf-8')).hexdigest()[:12]
+                manifest_key = f"{prefix}/_index/{self._compact(summary[1])}-{digest}.json"
+                if manifest_key in known_manifests:
+                    continue  # Redelivered batch; these turns are already archived
+
+                lines = [
+                    json.dumps({field: turn[field] for field in ARCHIVED_FIELDS if field in turn},
+                               default=_default, separators=(',', ':'))
+                    for turn in part_turns
+                ]
+                key = f"{prefix}/date={date}/part-{self._compact(summary[0])}-{digest}.jsonl.gz"
+                self.storage.put(key, gzip.compress('\n'.join(lines).encode('utf-8')))
+                # The manifest goes last, so readers never find a part that isn't there yet
+                self.storage.put(manifest_key, json.dumps({
+                    'key': key,
+                    'min_timestamp': summary[0],
+                    'max_timestamp': summary[1],
+                    'count': summary[2]
+                }).encode('utf-8'))
+                written += len(part_turns)
+
+            logger.info(f"Archived {len(turns)} turn(s) for {game_id}#{character_id}")
+
+        return written
+
+    def read(self, game_id: str, character_id: str, before: Optional[str] = None,
+             limit: int = 20) -> List[Dict]:
+        """
+        Read archived turns, newest first
+
+        Parts can overlap in time (the sweep and TTL expiry archive the same
+        conversation independently), so parts are read until the next one
+        can't hold anything newer than the oldest turn being returned.
+
+        Args:
+            before: Only return turns with a timestamp before this one
+            limit: Maximum number of turns
+
+        Returns:
+            Up to `limit` turns in reverse chronological order
+        """
+        turns: List[Dict] = []
+        for part in self._parts_newest_first(game_id, character_id):
+            if len(turns) >= limit and turns[limit - 1]['timestamp'] > part['max_timestamp']:
+                break  # Parts come by descending max timestamp; none of the rest can make the cut
+            if before and part['min_timestamp'] >= before:
+                continue
+            data = self.storage.get(part['key'])
+            if data is None:
+                logger.warning(f"Archive part missing: {part['key']}")
+                continue
+            part_turns = [json.loads(line) for line in gzip.decompress(data).splitlines() if line]
+            turns.extend(turn for turn in part_turns if not before or turn['timestamp'] < before)
+            turns.sort(key=lambda turn: turn['timestamp'], reverse=True)
+            del turns[limit:]
+
+        return turns
+
+    def scan(self, game_id: Optional[str] = None, since: Optional[str] = None,
+             until: Optional[str] = None) -> Iterator[List[Dict]]:
+        """
+        Read every archived turn, one part at a time, for offline analysis
+
+        Parts whose time range lies outside since/until are not opened.
+
+        Args:
+            game_id: Only this game's conversations; None for the whole archive
+            since: Only turns at or after this timestamp
+            until: Only turns at or before this timestamp
+
+        Yields:
+            Lists of archived turns
+        """
+        parts = []
+        for key in self.storage.list(f"game_id={game_id}" if game_id else ''):
+            if '/_index/' in key:
+                data = self.storage.get(key)
+                if data:
+                    parts.append(json.loads(data))
+
+        for part in parts:
+            if (since and part['max_timestamp'] < since) or (until and part['min_timestamp'] > until):
+                continue
+            data = self.storage.get(part['key'])
+            if data is None:
+                logger.warning(f"Archive part missing: {part['key']}")
+                continue
+            turns = [json.loads(line) for line in gzip.decompress(data).splitlines() if line]
+            yield [
+                turn for turn in turns
+                if (not since or turn['timestamp'] >= since) and (not until or turn['timestamp'] <= until)
+            ]
+
+
+def archive_stream_records(records: List[Dict], archive: HistoryArchive) -> int:
+    """Archive the chat turns that DynamoDB TTL removed from the table"""
+    deserializer = TypeDeserializer()
+    expired = []
+    for record in records:
+        if record.get('eventName') != 'REMOVE':
+            continue
+        if record.get('userIdentity', {}).get('principalId') != TTL_PRINCIPAL:
+            continue  # Sweep deletes are archived by the sweep itself
+        image = record.get('dynamodb', {}).get('OldImage')
+        if image:
+            expired.append({k: deserializer.deserialize(v) for k, v in image.items()})
+    return archive.write(expired)
+
+
+def sweep(table, archive: HistoryArchive, older_than_days: int, keep_recent: int = 5) -> int:
+    """
+    Archive and delete turns older than the cutoff from the hot table
+
+    The most recent `keep_recent` turns of each conversation stay in the table
+    so prompts of dormant conversations still see their latest history.
+
+    Returns:
+        Number of turns moved to the archive
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+    candidates: Dict[str, List[Dict]] = defaultdict(list)
+
+    scan_kwargs = {
+        'FilterExpression': '#ts < :cutoff AND attribute_exists(game_id)',
+        'ExpressionAttributeNames': {'#ts': 'timestamp'},
+        'ExpressionAttributeValues': {':cutoff': cutoff}
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if is_conversation_item(item):
+                candidates[item['composite_key']].append(item)
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    moved = 0
+    for composite_key, items in candidates.items():
+        recent = table.query(
+            KeyConditionExpression='composite_key = :key',
+            ExpressionAttributeValues={':key': composite_key},
+            ProjectionExpression='#ts',
+            ExpressionAttributeNames={'#ts': 'timestamp'},
+            ScanIndexForward=False,
+            Limit=keep_recent
+        ).get('Items', [])
+        keep = {item['timestamp'] for item in recent}
+        old = [item for item in items if item['timestamp'] not in keep]
+        if not old:
+            continue
+
+        archive.write(old)
+        with table.batch_writer() as batch:
+            for item in old:
+                batch.delete_item(Key={'composite_key': composite_key,
+                                       'timestamp': item['timestamp']})
+        moved += len(old)
+
+    logger.info(f"Swept {moved} turn(s) older than {cutoff} into the archive")
+    return moved
+
+
+def lambda_handler(event: Dict, context: LambdaContext) -> Dict:
+    """
+    Lambda handler for the history archiver
+
+    Invoked by the chat history table stream (TTL expiries) and by a schedule (sweep).
+    """
+    archive = HistoryArchive(create_archive_storage())
+    if 'Records' in event:
+        archived = archive_stream_records(event['Records'], archive)
+        return {'archived': archived}
+
+    table = boto3.resource('dynamodb').Table(os.environ['CHAT_HISTORY_TABLE'])
+    moved = sweep(
+        table,
+        archive,
+        older_than_days=int(os.environ.get('ARCHIVE_AFTER_DAYS', '7')),
+        keep_recent=int(os.environ.get('ARCHIVE_KEEP_RECENT', '5'))
+    )
+    return {'archived': moved}
@@ -0,0 +1,253 @@
+"""
+Knowledge Index Module
+Selects the parts of an NPC's lore that are relevant to the player's message
+
+The index is built offline from data/npc_backgrounds.json by
+scripts/build_knowledge_index.py and shipped with the Lambda code. Each NPC's
+record is split into small chunks scored with BM25, so the prompt carries the
+top chunks for the current message within a fixed token budget instead of
+the whole NPC record.
+"""
+
+import json
+import math
+import os
+import re
+from typing import Dict, List, Optional
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(__file__), 'knowledge_index.json')
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+MAX_CHUNK_WORDS = 60
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from', 'has', 'have',
+    'i', 'if', 'in', 'is', 'it', 'its', 'me', 'my', 'of', 'on', 'or', 'so', 'that', 'the',
+    'their', 'them', 'they', 'this', 'to', 'was', 'we', 'were', 'will', 'with', 'you', 'your'
+}
+
+# Sentences that tell the model how to change game state are always included
+PINNED_PATTERN = re.compile(r'game[ _]state|_quest', re.IGNORECASE)
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords; shared by the builder and the query side"""
+    return [token for token in re.findall(r'[a-z0-9]+', text.lower()) if token not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough model token count (about four characters per token)"""
+    return math.ceil(len(text) / 4)
+
+
+def strip_state_rules(text: str) -> str:
+    """
+    Drop the sentences that tell the model how to change game state
+
+    Used for NPCs whose quest transitions are applied by the rule engine, which
+    gives the model its own response format.
+    """
+    return ' '.join(
+        sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text)
+        if sentence.strip() and not PINNED_PATTERN.search(sentence)
+    )
+
+
+def _split_background(background: str) -> List[Dict]:
+    """Group background sentences into chunks of at most MAX_CHUNK_WORDS words"""
+    sentences = [s.strip() for s in SENTENCE_BOUNDARY.split(background) if s.strip()]
+    chunks = []
+    current: List[str] = []
+    for sentence in sentences:
+        if PINNED_PATTERN.search(sentence):
+            chunks.append({'text': sentence, 'pinned': True})
+            continue
+        if current and len(' '.join(current + [sentence]).split()) > MAX_CHUNK_WORDS:
+            chunks.append({'text': ' '.join(current), 'pinned': False})
+            current = []
+        current.append(sentence)
+    if current:
+        chunks.append({'text': ' '.join(current), 'pinned': False})
+    return chunks
+
+
+def chunk_npc(character_id: str, data: Dict) -> List[Dict]:
+    """
+    Split one NPC's data into retrievable chunks
+
+    The first chunk is the NPC's identity and is always included; the rest of
+    the record (background, relationships, wares, locations, ...) is scored.
+    """
+    name = data.get('name', character_id)
+    identity = f"You are {name}"
+    if data.get('role'):
+        identity += f", {data['role']}"
+    if data.get('faction'):
+        identity += f" ({data['faction']})"
+    identity += '.'
+    if data.get('personality_traits'):
+        identity += f" Personality: {', '.join(data['personality_traits'])}."
+    if data.get('default_disposition'):
+        identity += f" Default disposition: {data['default_disposition']}."
+
+    chunks = [{'text': identity, 'pinned': True}]
+    chunks.extend(_split_background(data.get('background', '')))
+
+    if data.get('key_relationships'):
+        relationships = '; '.join(f"{who}: {how}" for who, how in data['key_relationships'].items())
+        chunks.append({'text': f"Relationships - {relationships}.", 'pinned': False})
+    if data.get('secret_knowledge'):
+        chunks.append({'text': f"Secret knowledge: {data['secret_knowledge']}.", 'pinned': False})
+    if data.get('available_wares'):
+        chunks.append({'text': f"Wares for trade: {', '.join(data['available_wares'])}.",
+                       'pinned': False})
+    if data.get('quest_involvement'):
+        chunks.append({'text': f"Involved in: {', '.join(data['quest_involvement'])}.",
+                       'pinned': False})
+    preferences = data.get('location_preferences')
+    if preferences:
+        text = f"Usually found at {preferences.get('primary', 'unknown')}"
+        if preferences.get('secondary'):
+            text += f", sometimes at {', '.join(preferences['secondary'])}"
+        chunks.append({'text': text + '.', 'pinned': False})
+
+    return chunks
+
+
+def build_index(npc_data: Dict) -> Dict:
+    """
+    Build the BM25 index for all NPCs
+
+    Args:
+        npc_data: Contents of npc_backgrounds.json
+
+    Returns:
+        JSON-serializable index with per-chunk term frequencies and shared IDF values
+    """
+    npcs = {}
+    document_frequency: Dict[str, int] = {}
+    total_length = 0
+    total_chunks = 0
+
+    for character_id, data in npc_data.items():
+        chunks = []
+        for chunk in chunk_npc(character_id, data):
+            tokens = tokenize(chunk['text'])
+            frequencies: Dict[str, int] = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token in frequencies:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+            total_length += len(tokens)
+            total_chunks += 1
+            chunks.append({
+                'text': chunk['text'],
+                'pinned': chunk['pinned'],
+                'length': len(tokens),
+                'tokens': estimate_tokens(chunk['text']),
+                'tf': frequencies
+            })
+        npcs[character_id] = chunks
+
+    idf = {
+        token: round(math.log(1 + (total_chunks - df + 0.5) / (df + 0.5)), 4)
+        for token, df in document_frequency.items()
+    }
+    return {
+        'version': 1,
+        'avg_length': total_length / total_chunks if total_chunks else 0,
+        'idf': idf,
+        'npcs': npcs
+    }
+
+
+class KnowledgeIndex:
+    """
+    Query side of the knowledge index
+
+    Args:
+        index: Index dict produced by build_index; empty when no index was shipped
+    """
+
+    def __init__(self, index: Optional[Dict] = None):
+        self.index = index or {'avg_length': 0, 'idf': {}, 'npcs': {}}
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'KnowledgeIndex':
+        """Load the index shipped with the deployment (KNOWLEDGE_INDEX_PATH overrides the path)"""
+        path = path or os.environ.get('KNOWLEDGE_INDEX_PATH', DEFAULT_INDEX_PATH)
+        try:
+            with open(path, 'r') as f:
+                index = json.load(f)
+            logger.info(f"Loaded knowledge index for {len(index['npcs'])} NPCs from {path}")
+            return cls(index)
+        except FileNotFoundError:
+            logger.warning(f"No knowledge index at {path}, prompts will use full NPC records")
+        except Exception as e:
+            logger.error(f"Error loading knowledge index from {path}: {str(e)}")
+        return cls()
+
+    def has_npc(self, character_id: str) -> bool:
+        return character_id in self.index['npcs']
+
+    def _score(self, chunk: Dict, query_tokens: List[str]) -> float:
+        avg_length = self.index['avg_length'] or 1
+        score = 0.0
+        for token in query_tokens:
+            tf = chunk['tf'].get(token)
+            if not tf:
+                continue
+            idf = self.index['idf'].get(token, 0.0)
+            norm = K1 * (1 - B + B * chunk['length'] / avg_length)
+            score += idf * tf * (K1 + 1) / (tf + norm)
+        return score
+
+    def select(self, character_id: str, query: str, token_budget: int = 400,
+               top_k: int = 4, state_rules: bool = True) -> List[str]:
+        """
+        Pick the chunks to include in the prompt for this NPC
+
+        Pinned chunks (identity and game-state rules) are always included, except
+        game-state rules when state_rules is False (NPCs using the rule engine). The
+        remaining budget goes to the top_k chunks by BM25 score, or to the
+        earliest chunks when nothing matches the query. Chunks are returned in
+        their original order so the background still reads naturally.
+
+        Returns:
+            List of chunk texts; empty if the NPC is not in the index
+        """
+        chunks = self.index['npcs'].get(character_id)
+        if not chunks:
+            return []
+
+        # The identity chunk comes first and is never a game-state rule
+        excluded = set() if state_rules else {
+            i for i, chunk in enumerate(chunks)
+            if i > 0 and chunk['pinned'] and PINNED_PATTERN.search(chunk['text'])
+        }
+        selected = {i for i, chunk in enumerate(chunks) if chunk['pinned'] and i not in excluded}
+        budget = token_budget - sum(chunks[i]['tokens'] for i in selected)
+
+        query_tokens = tokenize(query)
+        scored = [
+            (self._score(chunk, query_tokens), i)
+            for i, chunk in enumerate(chunks) if not chunk['pinned']
+        ]
+        ranked = [i for score, i in sorted(scored, key=lambda s: (-s[0], s[1])) if score > 0]
+        if not ranked:
+            ranked = [i for _, i in scored]
+
+        for i in ranked[:top_k]:
+            if chunks[i]['tokens'] <= budget:
+                selected.add(i)
+                budget -= chunks[i]['tokens']
+
+        return [chunks[i]['text'] for i in sorted(selected)]
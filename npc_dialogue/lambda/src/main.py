@@ -8,6 +8,17 @@ Key Features:
 - Game state management and transitions
 - NPC background loading and context management
 - Structured dialogue responses with state changes
+- Asynchronous job mode backed by a queue and worker pool
+- Per-game world-event digest shared between NPCs
+- Retrieval of relevant NPC background chunks within a token budget
+- Proximity prefetch of conversation context and speculative greetings
+- Idempotency keys, single-flight coalescing and ordered conversation turns
+- Negotiated response format (flat JSON, MessagePack, compression)
+- Chat history reads that fall back to the compressed history archive
+- Sampled or header-requested profiling of handler invocations
+- Group scenes voicing several NPCs with one model call
+- Quest transitions validated and applied by a local rule engine
+- Deadline-aware shedding of optional work as the time budget runs out
 
 Dependencies:
 - AWS Bedrock for LLM dialogue generation
@@ -18,26 +29,80 @@ Dependencies:
 
 from enum import Enum
 import json
-from typing import Dict, List, Optional
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler import APIGatewayRestResolver
+from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType, process_partial_response
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
 import boto3
 import os
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 from .npc_loader import NPCLoader
+from .jobs import InvalidCallbackError, create_job_service
+from .world_digest import WorldDigest
+from .knowledge_index import KnowledgeIndex, strip_state_rules
+from .cache import TTLCache
+from .prefetch import SpeculativeResponseStore
+from .responses import build_response, compress_response
+from .history_archive import HistoryArchive, create_archive_storage
+from .profiling import profiled
+from .quest_rules import QuestRuleEngine
+from .deadline import DEADLINE_HEADER, Deadline, DeadlineExceededError
+from .concurrency import (
+    ConversationConflictError,
+    ConversationSequencer,
+    IdempotencyInProgressError,
+    IdempotencyKeyReuseError,
+    IdempotencyStore,
+    SingleFlight,
+    ThreadLocalTable,
+    request_fingerprint,
+)
 
 # Initialize Powertools
 logger = Logger()
 tracer = Tracer()
 app = APIGatewayRestResolver()
 
+@profiled
 def lambda_handler(event: Dict, context: LambdaContext) -> Dict:
     """
     Lambda handler for NPC dialogue generation
     """
-    return app.resolve(event, context)
+    return compress_response(app.resolve(event, context), event)
+
+@profiled
+def job_worker_handler(event: Dict, context: LambdaContext) -> Dict:
+    """
+    Lambda handler for the dialogue job worker, triggered by the job queue
+
+    Failed records are reported individually so that only they are redelivered.
+    """
+    return process_partial_response(
+        event=event,
+        record_handler=_process_job_record,
+        processor=job_processor,
+        context=context
+    )
+
+@profiled
+def job_dead_letter_handler(event: Dict, context: LambdaContext) -> Dict:
+    """
+    Lambda handler for the job dead-letter queue
+
+    Marks jobs whose attempts ran out as failed, so they don't stay running.
+    """
+    return process_partial_response(
+        event=event,
+        record_handler=_process_dead_letter_record,
+        processor=job_processor,
+        context=context
+    )
 
 class QuestState(str, Enum):
     """
@@ -80,6 +145,42 @@ class DialogueResponse(BaseModel):
     """
     dialogue: str
     game_state: GameState
+    # Model usage of the generation; recorded with the turn, not returned to the client
+    _metrics: Dict = PrivateAttr(default_factory=dict)
+
+class SceneLine(BaseModel):
+    """One line spoken by an NPC in a group scene"""
+    character_id: str
+    dialogue: str
+
+class SceneResponse(BaseModel):
+    """
+    Structured response from a group scene with several NPCs
+
+    Attributes:
+        lines: The NPCs' lines in speaking order
+        game_state: Current state of all quests after the scene
+    """
+    lines: List[SceneLine]
+    game_state: GameState
+    _metrics: Dict = PrivateAttr(default_factory=dict)
+
+DEFAULT_MODEL_ID = 'anthropic.claude-v2'
+
+LEGACY_RESPONSE_FORMAT = f"""Respond in two parts:
+1. DIALOGUE: Your in-character response
+2. GAME_STATE: Same format as the request game state with any modifications based on context of the interaction
+
+Available game states are:
+- potato_quest: {QuestState.UNKNOWN.value}/{QuestState.STARTED.value}/{QuestState.COMPLETE.value}
+- meat_quest: {QuestState.UNKNOWN.value}/{QuestState.STARTED.value}/{QuestState.COMPLETE.value}
+- map_quest: {QuestState.UNKNOWN.value}/{QuestState.STARTED.value}/{QuestState.COMPLETE.value}
+- smuggler_quest: {QuestState.UNKNOWN.value}/{QuestState.STARTED.value}/{QuestState.COMPLETE.value}
+
+Format your response as:
+DIALOGUE: [Your in-character response]
+GAME_STATE: [Same format as the request game state with any modifications based on context of the interaction]
+"""
 
 class DialogueGenerator:
     """
@@ -94,13 +195,34 @@ class DialogueGenerator:
     """
     def __init__(self):
         self.npc_loader = NPCLoader()
+        self.quest_rules = QuestRuleEngine(
+            self.npc_loader,
+            quests=GameState().dict().keys(),
+            states=[state.value for state in QuestState]
+        )
+        self.knowledge_index = KnowledgeIndex.load()
+        self.knowledge_token_budget = int(os.environ.get('KNOWLEDGE_TOKEN_BUDGET', '400'))
         # Initialize AWS clients
         self.bedrock = boto3.client(
             service_name='bedrock-runtime',
             region_name='us-east-1'
         )
-        self.dynamodb = boto3.resource('dynamodb')
-        self.chat_history_table = self.dynamodb.Table(os.environ['CHAT_HISTORY_TABLE'])
+        # Turns, prefetches and local jobs run on worker threads
+        self.chat_history_table = ThreadLocalTable(os.environ['CHAT_HISTORY_TABLE'])
+        self.world_digest = WorldDigest(self.chat_history_table)
+        # Conversation context warmed by /prefetch, used once by the next turn
+        prefetch_ttl = int(os.environ.get('PREFETCH_TTL', '120'))
+        self.warm_context = TTLCache(ttl_seconds=prefetch_ttl)
+        self.speculative_responses = SpeculativeResponseStore(
+            self.chat_history_table,
+            ttl_seconds=prefetch_ttl
+        )
+        self.history_archive = HistoryArchive(create_archive_storage())
+        self.sequencer = ConversationSequencer(self.chat_history_table)
+        self.idempotency = IdempotencyStore(
+            self.chat_history_table,
+            ttl_seconds=int(os.environ.get('IDEMPOTENCY_TTL', '300'))
+        )
 
     def _invoke_bedrock(self, prompt: str) -> str:
         """
@@ -150,7 +272,8 @@ class DialogueGenerator:
                     ':key': composite_key
                 },
                 ScanIndexForward=False,  # Most recent first
-                Limit=limit
+                Limit=limit,
+                ConsistentRead=True  # Turns are ordered against the latest history
             )
             
             history = response.get('Items', [])
@@ -163,7 +286,51 @@ class DialogueGenerator:
             logger.error(f"Error retrieving chat history: {str(e)}")
             return []
     
-    def store_interaction(self, game_id: str, character_id: str, context: Dict, response: Dict):
+    def get_history_page(self, game_id: str, character_id: str, limit: int = 20,
+                         before: Optional[str] = None) -> List[Dict]:
+        """
+        Retrieve a page of chat history, reading from the archive once the table runs out
+
+        Args:
+            game_id: The unique identifier for the game session
+            character_id: The NPC's identifier
+            limit: Maximum number of history items to return
+            before: Only return interactions with a timestamp before this one
+
+        Returns:
+            Interactions, newest first
+        """
+        composite_key = self._create_composite_key(game_id, character_id)
+        key_condition = 'composite_key = :key'
+        values = {':key': composite_key}
+        if before:
+            key_condition += ' AND #ts < :before'
+            values[':before'] = before
+
+        query_kwargs = {
+            'KeyConditionExpression': key_condition,
+            'ExpressionAttributeValues': values,
+            'ScanIndexForward': False,  # Most recent first
+            'Limit': limit
+        }
+        if before:
+            query_kwargs['ExpressionAttributeNames'] = {'#ts': 'timestamp'}
+        history = self.chat_history_table.query(**query_kwargs).get('Items', [])
+
+        if len(history) < limit:
+            oldest = history[-1]['timestamp'] if history else before
+            history.extend(self.history_archive.read(
+                game_id,
+                character_id,
+                before=oldest,
+                limit=limit - len(history)
+            ))
+
+        logger.info(f"Retrieved {len(history)} history items for {composite_key}")
+        return history
+
+    def store_interaction(self, game_id: str, character_id: str, context: Dict, response: Dict,
+                          expected_turn: Optional[int] = None, metrics: Optional[Dict] = None):
         """
         Store an interaction in the chat history
         
@@ -172,6 +339,12 @@ class DialogueGenerator:
             character_id: The NPC's identifier
             context: The request context
             response: The generated response
+            expected_turn: Turn count the response was generated against; when given,
+                the interaction is only stored if no other turn was stored since
+            metrics: Latency and token usage of the turn, for offline analytics
+
+        Raises:
+            ConversationConflictError: The conversation moved on while generating
         """
         try:
             composite_key = self._create_composite_key(game_id, character_id)
@@ -186,13 +359,28 @@ class DialogueGenerator:
                 'response': response,
                 'ttl': int((datetime.utcnow().timestamp() + (30 * 24 * 60 * 60)))  # 30 days TTL
             }
+            if metrics:
+                item['metrics'] = metrics
             
-            self.chat_history_table.put_item(Item=item)
+            if expected_turn is None:
+                self.chat_history_table.put_item(Item=item)
+            else:
+                self.sequencer.record_turn(composite_key, expected_turn, item)
+            self.warm_context.delete(composite_key)
             logger.info(f"Stored interaction for {composite_key}")
             
+        except ConversationConflictError:
+            self.warm_context.delete(composite_key)
+            raise
         except Exception as e:
             logger.error(f"Error storing interaction: {str(e)}")
             raise
+
+        # The digest is best-effort; a failed update must not fail the turn
+        try:
+            self.world_digest.record_interaction(game_id, character_id, context, response)
+        except Exception as e:
+            logger.error(f"Error updating world digest: {str(e)}")
     
     def synthesize_conversation_history(self, history: List[Dict]) -> str:
         """Convert chat history into a contextual summary"""
@@ -202,28 +390,138 @@ class DialogueGenerator:
         summary = []
         for entry in history:
             player_msg = entry['context']['player_message']
+            scene_lines = entry['context'].get('scene_lines')
+            if scene_lines:
+                # Group scene: the NPC heard everyone, not just its own lines
+                spoken = "\n".join(f"{line['character_id']}: {line['dialogue']}" for line in scene_lines)
+                summary.append(f"Player (to the group): {player_msg}\n{spoken}")
+                continue
             npc_response = entry['response']
             summary.append(f"Player: {player_msg}\nNPC: {npc_response}")
         
         return "\n\nPrevious conversation:\n" + "\n".join(summary[-3:])  # Last 3 interactions
 
+    def load_conversation_context(self, game_id: str, character_id: str) -> Dict:
+        """
+        Load the per-conversation parts of the prompt
+
+        Returns:
+            Dict with the rendered conversation history and world digest context
+        """
+        history = self.get_chat_history(game_id=game_id, character_id=character_id)
+        return {
+            'conversation_context': self.synthesize_conversation_history(history),
+            'world_context': WorldDigest.format_for_prompt(
+                self.world_digest.get(game_id),
+                character_id
+            )
+        }
+
+    def warm_conversation(self, game_id: str, character_id: str):
+        """
+        Load a conversation's context ahead of the player's first message
+
+        The NPC record is cached by the loader; every turn reads it, at least to
+        check for quest transitions. The conversation context is kept for the next
+        turn only, together with the turn it was loaded at, so a turn stored
+        meanwhile (possibly by another container) makes it stale.
+        """
+        self.npc_loader.get_npc_background(character_id)
+        composite_key = self._create_composite_key(game_id, character_id)
+        turn = self.sequencer.current_turn(composite_key)
+        self.warm_context.set(
+            composite_key,
+            {**self.load_conversation_context(game_id, character_id), 'turn': turn}
+        )
+
+    def take_warm_context(self, game_id: str, character_id: str,
+                          expected_turn: Optional[int] = None) -> Optional[Dict]:
+        """
+        Claim the context warmed by /prefetch for this turn
+
+        Returns:
+            The warmed context, or None if there is none or it was loaded at a
+            turn other than expected_turn
+        """
+        conversation = self.warm_context.pop(self._create_composite_key(game_id, character_id))
+        if conversation is None:
+            return None
+        if expected_turn is not None and conversation['turn'] != expected_turn:
+            logger.info(f"Dropping warm context for {game_id}#{character_id}, conversation moved on")
+            return None
+        return conversation
+
+    def load_npc_background(self, character_id: str, player_message: str,
+                            token_budget: Optional[int] = None) -> str:
+        """
+        Load the NPC background chunks relevant to the player's message, falling
+        back to the full NPC record for NPCs missing from the index
+
+        NPCs whose transitions are applied by the rule engine get their own
+        response format, so the background's game-state instructions are left out.
+        """
+        uses_rules = self.quest_rules.uses_rules([character_id])
+        knowledge = self.knowledge_index.select(
+            character_id,
+            player_message,
+            token_budget=token_budget or self.knowledge_token_budget,
+            state_rules=not uses_rules
+        )
+        if knowledge:
+            return "\n".join(knowledge)
+
+        print(f'Attempting to load NPC background: {character_id}')
+        npc_background = self.npc_loader.get_npc_background(character_id)
+        if not npc_background:
+            logger.warning(f"No background found for character: {character_id}")
+            return "Default NPC background"
+        # The transition table is for the rule engine, not the model
+        npc_background = {key: value for key, value in npc_background.items() if key != 'quest_transitions'}
+        if uses_rules and isinstance(npc_background.get('background'), str):
+            npc_background['background'] = strip_state_rules(npc_background['background'])
+        return npc_background
+
+    def _transition_instructions(self, transitions: List[Dict]) -> str:
+        """Response format for NPCs whose quest transitions are applied by the rule engine"""
+        if not transitions:
+            return ("Respond with your in-character response only. Nothing in this "
+                    "interaction can change the game state.\n\n"
+                    "Format your response as:\nDIALOGUE: [Your in-character response]\n")
+        return f"""Respond in two parts:
+1. DIALOGUE: Your in-character response
+2. TRANSITION: The id of the transition this interaction completes, or none
+
+The game state only changes through these transitions, and only when their conditions are met:
+{self.quest_rules.describe(transitions)}
+
+Format your response as:
+DIALOGUE: [Your in-character response]
+TRANSITION: [transition id or none]
+"""
+
     @tracer.capture_method
-    def generate_prompt(self, context: Dict) -> str:
+    def generate_prompt(self, context: Dict, deadline: Optional[Deadline] = None,
+                        expected_turn: Optional[int] = None) -> str:
+        deadline = deadline or Deadline.unbounded()
         try:
-            # Load NPC background
             character = context['character_id']
-            print(f'Attempting to load NPC background: {character}')
-            npc_background = self.npc_loader.get_npc_background(character)
-            if not npc_background:
-                logger.warning(f"No background found for character: {character}")
-                npc_background = "Default NPC background"
-
-            # Get conversation history
-            history = self.get_chat_history(
-                game_id=context['game_id'],
-                character_id=context['character_id']
+
+            # Get conversation history and what other NPCs in this game have
+            # seen and heard, unless /prefetch already loaded them at this turn
+            # or there is no time left to read them (the first stage shed)
+            conversation = self.take_warm_context(context['game_id'], character, expected_turn)
+            if conversation is None and deadline.skip_history():
+                conversation = {'conversation_context': '', 'world_context': ''}
+            elif conversation is None:
+                conversation = self.load_conversation_context(context['game_id'], character)
+            conversation_context = conversation['conversation_context']
+            world_context = conversation['world_context']
+
+            npc_background = self.load_npc_background(
+                character,
+                context.get('player_message', ''),
+                token_budget=deadline.knowledge_budget(self.knowledge_token_budget)
             )
-            conversation_context = self.synthesize_conversation_history(history)
 
             # Format game state for prompt
             game_state_context = "\n".join([
@@ -231,6 +529,13 @@ class DialogueGenerator:
                 for quest, state in context['game_state'].items()
             ])
 
+            if self.quest_rules.uses_rules([character]):
+                response_format = self._transition_instructions(
+                    self.quest_rules.available([character], context['game_state'])
+                )
+            else:
+                response_format = LEGACY_RESPONSE_FORMAT
+
             prompt = f"""You are an NPC named {context['character_id']} with the following background:
 {npc_background}
 
@@ -244,24 +549,12 @@ Weather: {context.get('weather', 'unknown')}
 Player status:
 - Location: {context.get('player_location', 'unknown')}
 - Reputation: {json.dumps(context.get('reputation', {}), indent=2)}
+{world_context}
 {conversation_context}
 
 Player says: {context.get('player_message', '')}
 
-Respond in two parts:
-1. DIALOGUE: Your in-character response
-2. GAME_STATE: Same format as the request game state with any modifications based on context of the interaction
-
-Available game states are:
-- potato_quest: {QuestState.UNKNOWN.value}/{QuestState.STARTED.value}/{QuestState.COMPLETE.value}
-- meat_quest: {QuestState.UNKNOWN.value}/{QuestState.STARTED.value}/{QuestState.COMPLETE.value}
-- map_quest: {QuestState.UNKNOWN.value}/{QuestState.STARTED.value}/{QuestState.COMPLETE.value}
-- smuggler_quest: {QuestState.UNKNOWN.value}/{QuestState.STARTED.value}/{QuestState.COMPLETE.value}
-
-Format your response as:
-DIALOGUE: [Your in-character response]
-GAME_STATE: [Same format as the request game state with any modifications based on context of the interaction]
-"""
+{response_format}"""
             print(prompt)
             return prompt
 
@@ -269,47 +562,33 @@ GAME_STATE: [Same format as the request game state with any modifications based
             logger.error(f"Error generating prompt: {str(e)}")
             raise
 
-    def parse_response(self, response_text: str, current_game_state: Dict) -> DialogueResponse:
-        """Parse LLM response into dialogue and state changes"""
+    def parse_response(self, response_text: str, current_game_state: Dict,
+                       character_id: Optional[str] = None) -> DialogueResponse:
+        """
+        Parse LLM response into dialogue and the resulting game state
+
+        NPCs with a transition table answer with a TRANSITION id that the rule
+        engine validates and applies; any game state the model writes is ignored.
+        Other NPCs answer with the full GAME_STATE.
+        """
         try:
-            parts = response_text.split('STATE_CHANGES:')
-            dialogue = parts[0].replace('DIALOGUE:', '').strip()
-            
-            # Start with current game state
-            new_game_state = GameState(**current_game_state)
-            state_changes = []
-            
-            if len(parts) > 1:
-                changes_text = parts[1].strip()
-                for change in changes_text.split('-')[1:]:
-                    try:
-                        lines = change.strip().split('\n')
-                        change_dict = {}
-                        for line in lines:
-                            if ':' in line:
-                                key, value = line.split(':', 1)
-                                change_dict[key.strip()] = value.strip()
-                        
-                        if 'QUEST' in change_dict and 'NEW_STATE' in change_dict:
-                            quest_name = change_dict['QUEST'].lower()
-                            new_state = change_dict['NEW_STATE'].lower()
-                            if hasattr(new_game_state, quest_name) and new_state in QuestState.__members__:
-                                setattr(new_game_state, quest_name, QuestState(new_state))
-                                state_changes.append({
-                                    'quest': quest_name,
-                                    'old_state': current_game_state.get(quest_name, QuestState.UNKNOWN),
-                                    'new_state': new_state,
-                                    'reason': change_dict.get('REASON', 'No reason provided')
-                                })
-                    
-                    except Exception as e:
-                        logger.warning(f"Error parsing state change: {str(e)}")
-                        continue
-                dialogue = dialogue.split('GAME_STATE:')[0].strip()
+            text, _, game_state_text = response_text.partition('GAME_STATE:')
+            text, _, transition_text = text.partition('TRANSITION:')
+            dialogue = text.replace('DIALOGUE:', '').strip()
+
+            if character_id and self.quest_rules.uses_rules([character_id]):
+                new_state, applied, rejected = self.quest_rules.apply(
+                    [character_id],
+                    self.quest_rules.parse_ids(transition_text),
+                    GameState(**current_game_state).dict()
+                )
+                response = DialogueResponse(dialogue=dialogue, game_state=GameState(**new_state))
+                response._metrics.update({'transitions': applied, 'rejected_transitions': rejected})
+                return response
+
             return DialogueResponse(
                 dialogue=dialogue,
-                game_state=new_game_state,
-                state_changes=state_changes
+                game_state=self.parse_game_state(game_state_text, current_game_state)
             )
             
         except Exception as e:
@@ -319,42 +598,526 @@ GAME_STATE: [Same format as the request game state with any modifications based
                 game_state=GameState(**current_game_state)
             )
 
+    def _invoke_messages(self, prompt: str, max_tokens: int,
+                         model_id: str = DEFAULT_MODEL_ID) -> Tuple[str, Dict]:
+        """
+        Invoke the model with a single user message
+
+        Returns:
+            The reply text and the call's latency and token usage
+        """
+        started = time.perf_counter()
+        response = self.bedrock.invoke_model(
+            modelId=model_id,
+            body=json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": max_tokens,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            })
+        )
+        response_body = json.loads(response.get('body').read())
+        usage = response_body.get('usage', {})
+        metrics = {
+            'model_id': model_id,
+            'model_latency_ms': int((time.perf_counter() - started) * 1000),
+            'input_tokens': int(usage.get('input_tokens', 0)),
+            'output_tokens': int(usage.get('output_tokens', 0))
+        }
+
+        response_body = response_body.get('content', '')
+        return response_body[0]['text'], metrics
+
     @tracer.capture_method
-    def generate_dialogue(self, context: Dict) -> DialogueResponse:
+    def generate_dialogue(self, context: Dict, deadline: Optional[Deadline] = None,
+                          expected_turn: Optional[int] = None) -> DialogueResponse:
         print('Generating dialogue')
         print(context)
+        deadline = deadline or Deadline.unbounded()
         try:
-            prompt = self.generate_prompt(context)
-            
-            response = self.bedrock.invoke_model(
-                modelId='anthropic.claude-v2',
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 500,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                })
-            )
-            response_body = json.loads(response.get('body').read())
-
-            response_body = response_body.get('content', '')
-            response_text = response_body[0]['text']
+            prompt = self.generate_prompt(context, deadline, expected_turn)
+            model_id, max_tokens = deadline.generation(DEFAULT_MODEL_ID, 500)
+            response_text, metrics = self._invoke_messages(prompt, max_tokens=max_tokens,
+                                                           model_id=model_id)
 
-            parsed_response = self.parse_response(response_text, context['game_state'])
+            parsed_response = self.parse_response(
+                response_text,
+                context['game_state'],
+                character_id=context['character_id']
+            )
+            parsed_response._metrics.update(metrics)
 
             return parsed_response
             
+        except DeadlineExceededError as e:
+            logger.warning(f"Not generating dialogue: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Error generating dialogue: {str(e)}")
             raise
 
+    def parse_game_state(self, text: str, current_game_state: Dict) -> GameState:
+        """
+        Apply the quest states found in a GAME_STATE block to the current game state
+
+        Accepts the JSON object the prompt asks for as well as `quest: state`
+        lines; unknown quests and states are ignored.
+        """
+        new_game_state = GameState(**current_game_state).dict()
+        updates: Dict = {}
+        match = re.search(r'\{.*\}', text, re.S)
+        if match:
+            try:
+                updates = json.loads(match.group(0))
+            except ValueError:
+                updates = {}
+        if not isinstance(updates, dict) or not updates:
+            updates = dict(re.findall(r'(\w+)\s*[:=]\s*"?(\w+)"?', text))
+
+        valid_states = {state.value for state in QuestState}
+        for quest, state in updates.items():
+            quest, state = str(quest).strip().lower(), str(state).strip().lower()
+            if quest in new_game_state and state in valid_states:
+                new_game_state[quest] = state
+        return GameState(**new_game_state)
+
+    @tracer.capture_method
+    def generate_scene_prompt(self, context: Dict,
+                              expected_turns: Optional[Dict[str, int]] = None) -> str:
+        """
+        Build one prompt that voices every NPC in a group scene
+
+        The shared parts (game state, surroundings, world digest) appear once;
+        each NPC contributes its background and its own conversation history.
+        """
+        character_ids = context['character_ids']
+        player_message = context.get('player_message', '')
+
+        profiles = []
+        for character in character_ids:
+            conversation = self.take_warm_context(
+                context['game_id'], character, (expected_turns or {}).get(character)
+            )
+            if conversation is None:
+                history = self.get_chat_history(game_id=context['game_id'], character_id=character)
+                conversation_context = self.synthesize_conversation_history(history)
+            else:
+                conversation_context = conversation['conversation_context']
+            profiles.append(
+                f"### {character}\n"
+                f"{self.load_npc_background(character, player_message)}"
+                f"{conversation_context}"
+            )
+
+        # Events of the NPCs in the scene are covered by their own histories
+        world_context = WorldDigest.format_for_prompt(
+            self.world_digest.get(context['game_id']),
+            character_ids[0],
+            present=character_ids
+        )
+        game_state_context = "\n".join([
+            f"- {quest}: {state}"
+            for quest, state in context['game_state'].items()
+        ])
+        speakers = ", ".join(character_ids)
+
+        if self.quest_rules.uses_rules(character_ids):
+            transitions = self.quest_rules.available(character_ids, context['game_state'])
+            if transitions:
+                state_format = f"""After the last line, name the transitions the scene completes, once:
+TRANSITION: [transition ids separated by commas, or none]
+
+The game state only changes through these transitions, and only when their conditions are met:
+{self.quest_rules.describe(transitions, with_speaker=True)}
+"""
+            else:
+                state_format = "Nothing in this scene can change the game state.\n"
+        else:
+            quest_states = '/'.join(state.value for state in QuestState)
+            available_states = "\n".join(
+                f"- {quest}: {quest_states}" for quest in GameState().dict()
+            )
+            state_format = f"""After the last line, give the game state once for the whole scene:
+GAME_STATE: [Same format as the request game state with any modifications based on context of the interaction]
+
+Available game states are:
+{available_states}
+"""
+
+        prompt = f"""You are voicing a scene in which several NPCs talk with the player together.
+
+Characters in the scene:
+
+{chr(10).join(profiles)}
+
+Current game state:
+{game_state_context}
+
+Location: {context.get('location', 'unknown')}
+Time of day: {context.get('time_of_day', 'unknown')}
+Weather: {context.get('weather', 'unknown')}
+
+Player status:
+- Location: {context.get('player_location', 'unknown')}
+- Reputation: {json.dumps(context.get('reputation', {}), indent=2)}
+{world_context}
+
+Player says to the group: {player_message}
+
+Reply as the characters, in character and in the order they would speak. Not every
+character has to speak, and characters may react to each other. Each line is:
+SPEAKER: [one of: {speakers}]
+DIALOGUE: [That character's line]
+
+{state_format}"""
+        logger.debug(prompt)
+        return prompt
+
+    def parse_scene_response(self, response_text: str, context: Dict) -> SceneResponse:
+        """Split a multi-speaker reply into per-NPC lines and one game state"""
+        character_ids = {character.lower(): character for character in context['character_ids']}
+        body, _, game_state_text = response_text.partition('GAME_STATE:')
+        body, _, transition_text = body.partition('TRANSITION:')
+
+        lines = []
+        for match in re.finditer(r'SPEAKER:\s*(.+?)\s*\n\s*DIALOGUE:\s*(.*?)(?=\n\s*SPEAKER:|\Z)', body, re.S):
+            speaker = match.group(1).strip().strip('[]').lower()
+            dialogue = match.group(2).strip()
+            if speaker not in character_ids:
+                logger.warning(f"Dropping scene line from unexpected speaker: {speaker}")
+                continue
+            if dialogue:
+                lines.append(SceneLine(character_id=character_ids[speaker], dialogue=dialogue))
+
+        if self.quest_rules.uses_rules(context['character_ids']):
+            new_state, applied, rejected = self.quest_rules.apply(
+                context['character_ids'],
+                self.quest_rules.parse_ids(transition_text),
+                GameState(**context['game_state']).dict()
+            )
+            scene = SceneResponse(lines=lines, game_state=GameState(**new_state))
+            scene._metrics.update({'transitions': applied, 'rejected_transitions': rejected})
+            return scene
+
+        return SceneResponse(
+            lines=lines,
+            game_state=self.parse_game_state(game_state_text, context['game_state'])
+        )
+
+    @tracer.capture_method
+    def generate_scene(self, context: Dict,
+                       expected_turns: Optional[Dict[str, int]] = None) -> SceneResponse:
+        """Generate every NPC's part of a group scene with a single model call"""
+        try:
+            prompt = self.generate_scene_prompt(context, expected_turns)
+            # Room for a line or two per NPC plus the game state
+            max_tokens = 150 * len(context['character_ids']) + 150
+            response_text, metrics = self._invoke_messages(prompt, max_tokens=max_tokens)
+            scene = self.parse_scene_response(response_text, context)
+            scene._metrics.update(metrics)
+            return scene
+
+        except Exception as e:
+            logger.error(f"Error generating scene: {str(e)}")
+            raise
+
+    def store_scene(self, context: Dict, scene: SceneResponse, expected_turns: Dict[str, int],
+                    metrics: Optional[Dict] = None):
+        """
+        Store a scene as a turn of each speaking NPC's conversation
+
+        Each turn's response holds that NPC's own lines; its context keeps the
+        whole scene, so the NPC's later prompts see what the others said. All
+        turns are recorded in one transaction, so the scene is stored for every
+        NPC or for none. Each turn carries the whole scene's metrics along with
+        the scene size.
+
+        Raises:
+            ConversationConflictError: One of the conversations moved on while generating
+        """
+        game_id = context['game_id']
+        game_state = scene.game_state.dict()
+        spoken: Dict[str, List[str]] = {}
+        for line in scene.lines:
+            spoken.setdefault(line.character_id, []).append(line.dialogue)
+        transcript = [line.dict() for line in scene.lines]
+
+        timestamp = datetime.utcnow().isoformat()
+        ttl = int((datetime.utcnow().timestamp() + (30 * 24 * 60 * 60)))  # 30 days TTL
+        turns = []
+        for character_id, dialogue in spoken.items():
+            composite_key = self._create_composite_key(game_id, character_id)
+            turn_context = {key: value for key, value in context.items() if key != 'character_ids'}
+            turn_context.update({
+                'character_id': character_id,
+                'scene': context['character_ids'],
+                'scene_lines': transcript
+            })
+            turns.append((composite_key, expected_turns[character_id], {
+                'composite_key': composite_key,
+                'timestamp': timestamp,
+                'game_id': game_id,
+                'character_id': character_id,
+                'context': turn_context,
+                'response': {'dialogue': ' '.join(dialogue), 'game_state': game_state},
+                'ttl': ttl,
+                **({'metrics': {**metrics, 'scene_size': len(spoken)}} if metrics else {})
+            }))
+        if not turns:
+            return
+
+        try:
+            self.sequencer.record_turns(turns)
+            logger.info(f"Stored scene turns for {', '.join(spoken)} in {game_id}")
+        finally:
+            for composite_key, _, _ in turns:
+                self.warm_context.delete(composite_key)
+
+        # One digest update for the scene, attributed to its first speaker
+        try:
+            first = turns[0][2]
+            self.world_digest.record_interaction(game_id, first['character_id'],
+                                                 first['context'], first['response'])
+        except Exception as e:
+            logger.error(f"Error updating world digest: {str(e)}")
+
 # Initialize the dialogue generator
 dialogue_generator = DialogueGenerator()
 
+REQUIRED_FIELDS = ['game_id', 'character_id', 'player_message', 'game_state']
+
+MAX_TURN_ATTEMPTS = 2
+
+def process_dialogue_request(context: Dict, deadline: Optional[Deadline] = None) -> Dict:
+    """
+    Generate dialogue for a validated request and record the interaction
+
+    Shared by the synchronous endpoint and the asynchronous job worker. If another
+    turn of the same conversation is stored while this one is generating, the turn
+    is generated again against the fresh history.
+
+    Args:
+        context: The validated request
+        deadline: Time budget of a synchronous request; optional stages are shed
+            as it runs out. Queued jobs run without one.
+
+    Raises:
+        ConversationConflictError: The conversation kept moving on for every attempt
+        DeadlineExceededError: Too little time was left to call the model
+    """
+    deadline = deadline or Deadline.unbounded()
+    composite_key = dialogue_generator._create_composite_key(
+        context['game_id'],
+        context['character_id']
+    )
+    for attempt in range(1, MAX_TURN_ATTEMPTS + 1):
+        expected_turn = dialogue_generator.sequencer.current_turn(composite_key)
+        started = time.perf_counter()
+
+        # Serve the greeting generated by /prefetch if this turn is the one it anticipated
+        speculative = None
+        if attempt == 1:
+            speculative = dialogue_generator.speculative_responses.take(
+                context['game_id'],
+                context['character_id'],
+                context['player_message'],
+                context['game_state'],
+                expected_turn,
+                check_shared=bool(context.get('prefetched'))
+            )
+        if speculative is not None:
+            response = DialogueResponse(**speculative)
+        else:
+            logger.info("Generating dialogue response")
+            response = dialogue_generator.generate_dialogue(context, deadline, expected_turn)
+            logger.info("Dialogue generated successfully")
+        print(response.dict())
+        metrics = {
+            **response._metrics,
+            'latency_ms': int((time.perf_counter() - started) * 1000),
+            'speculative': speculative is not None
+        }
+
+        # Out of time: the worker stores the interaction after the response is sent
+        if deadline.defer_write():
+            metrics['degraded'] = deadline.shed
+            deadline.report('generate-dialogue')
+            payload = {
+                'game_id': context['game_id'],
+                'character_id': context['character_id'],
+                'context': context,
+                'response': response.dict(),
+                'expected_turn': expected_turn,
+                'metrics': metrics
+            }
+            # The dialogue is ready; failing to queue its write must not lose it
+            try:
+                job_service.defer(DEFERRED_STORE_TASK, payload)
+            except Exception as defer_error:
+                logger.warning(f"Error deferring interaction write, storing it now: {str(defer_error)}")
+                try:
+                    if deadline.remaining_ms() <= 0:
+                        raise DeadlineExceededError("No time left to store the interaction")
+                    _store_deferred_interaction(payload)
+                except Exception as store_error:
+                    logger.error(f"Interaction for {composite_key} was not stored: {str(store_error)}",
+                                 extra={'metrics': metrics})
+            return response.dict()
+        if deadline.degraded:
+            metrics['degraded'] = deadline.shed
+            deadline.report('generate-dialogue')
+
+        # Store interaction
+        try:
+            dialogue_generator.store_interaction(
+                game_id=context['game_id'],
+                character_id=context['character_id'],
+                context=context,
+                response=response.dict(),
+                expected_turn=expected_turn,
+                metrics=metrics
+            )
+            logger.info("Interaction stored successfully")
+        except ConversationConflictError:
+            if attempt == MAX_TURN_ATTEMPTS:
+                raise
+            logger.info(f"{composite_key} moved on during generation, regenerating")
+            continue
+        except Exception as store_error:
+            logger.error(f"Error storing interaction: {str(store_error)}")
+            # Continue even if storage fails
+
+        return response.dict()
+
+MAX_SCENE_CHARACTERS = 5
+
+SCENE_REQUIRED_FIELDS = ['game_id', 'character_ids', 'player_message', 'game_state']
+
+def process_scene_request(context: Dict) -> Dict:
+    """
+    Generate a group scene with one model call and record each NPC's turn
+
+    Like single NPC turns, the scene is generated again if one of its
+    conversations moved on while it was generating.
+
+    Raises:
+        ConversationConflictError: The conversations kept moving on for every attempt
+    """
+    for attempt in range(1, MAX_TURN_ATTEMPTS + 1):
+        expected_turns = {
+            character_id: dialogue_generator.sequencer.current_turn(
+                dialogue_generator._create_composite_key(context['game_id'], character_id)
+            )
+            for character_id in context['character_ids']
+        }
+
+        logger.info(f"Generating scene for {len(context['character_ids'])} characters")
+        started = time.perf_counter()
+        scene = dialogue_generator.generate_scene(context, expected_turns)
+        metrics = {**scene._metrics, 'latency_ms': int((time.perf_counter() - started) * 1000)}
+
+        try:
+            dialogue_generator.store_scene(context, scene, expected_turns, metrics)
+        except ConversationConflictError:
+            if attempt == MAX_TURN_ATTEMPTS:
+                raise
+            logger.info("Scene conversations moved on during generation, regenerating")
+            continue
+        except Exception as store_error:
+            logger.error(f"Error storing scene: {str(store_error)}")
+            # Continue even if storage fails
+
+        return scene.dict()
+
+# Identical requests in flight in this process share one execution
+single_flight = SingleFlight()
+
+def process_idempotent_request(context: Dict, idempotency_key: Optional[str] = None,
+                               process: Callable[[Dict], Dict] = process_dialogue_request) -> Dict:
+    """
+    Process a request at most once per idempotency key
+
+    A retry with the same key gets the stored result back without another model
+    call. Identical requests in flight at the same time are coalesced.
+
+    Args:
+        context: The validated request
+        idempotency_key: Client supplied key, if any
+        process: Handler for the request (single NPC turn or group scene)
+
+    Raises:
+        IdempotencyInProgressError: The original request with this key is still running
+        IdempotencyKeyReuseError: The key was already used for a different request
+    """
+    fingerprint = request_fingerprint(context)
+
+    def run() -> Dict:
+        if not idempotency_key:
+            return process(context)
+
+        scope = context['game_id']
+        stored = dialogue_generator.idempotency.begin(scope, idempotency_key, fingerprint)
+        if stored is not None:
+            return stored
+        try:
+            result = process(context)
+        except Exception:
+            dialogue_generator.idempotency.release(scope, idempotency_key)
+            raise
+        dialogue_generator.idempotency.complete(scope, idempotency_key, fingerprint, result)
+        return result
+
+    return single_flight.do(fingerprint, run)
+
+# Initialize the job service and queue worker
+job_service = create_job_service(process_dialogue_request)
+job_processor = BatchProcessor(event_type=EventType.SQS)
+
+DEFERRED_STORE_TASK = 'store_interaction'
+
+def _store_deferred_interaction(payload: Dict):
+    """
+    Store an interaction whose write was deferred to meet the request deadline
+
+    The player has already seen the response, so if other turns were stored in
+    the meantime it is appended after them rather than dropped.
+
+    Raises:
+        ConversationConflictError: The conversation kept moving on; the task is
+            redelivered and ends up in the dead-letter queue if that continues
+    """
+    composite_key = dialogue_generator._create_composite_key(payload['game_id'], payload['character_id'])
+    expected_turn = payload['expected_turn']
+    for attempt in range(1, MAX_TURN_ATTEMPTS + 1):
+        try:
+            dialogue_generator.store_interaction(**{**payload, 'expected_turn': expected_turn})
+            return
+        except ConversationConflictError:
+            if attempt == MAX_TURN_ATTEMPTS:
+                raise
+            expected_turn = dialogue_generator.sequencer.current_turn(composite_key)
+            logger.warning(f"Conversation moved on before deferred write, appending at turn {expected_turn + 1}")
+
+job_service.register_task(DEFERRED_STORE_TASK, _store_deferred_interaction)
+
+def _process_job_record(record: SQSRecord):
+    message = json.loads(record.body)
+    if 'task' in message:
+        job_service.run_task(message['task'], message['payload'])
+    else:
+        job_service.process(message['job_id'])
+
+def _process_dead_letter_record(record: SQSRecord):
+    message = json.loads(record.body)
+    if 'task' in message:
+        logger.error(f"Deferred {message['task']} was dead-lettered: {record.body}")
+    else:
+        job_service.abandon(message['job_id'])
+
 @app.post("/generate-dialogue")
 @tracer.capture_method
 def handle_dialogue_generation():
@@ -365,48 +1128,276 @@ def handle_dialogue_generation():
         logger.info(f"Request context: {json.dumps(context)}")
         
         # Validate required fields
-        required_fields = ['game_id', 'character_id', 'player_message', 'game_state']
-        missing_fields = [field for field in required_fields if field not in context]
+        missing_fields = [field for field in REQUIRED_FIELDS if field not in context]
         
         if missing_fields:
             logger.error(f"Missing required fields: {missing_fields}")
-            return {
-                "statusCode": 400,
-                "body": json.dumps({
-                    "error": f"Missing required fields: {missing_fields}"
-                })
-            }
-        
-        logger.info("Generating dialogue response")
-        response = dialogue_generator.generate_dialogue(context)
-        logger.info("Dialogue generated successfully")
-        print(response.dict())
-        
-        # Store interaction
-        try:
-            dialogue_generator.store_interaction(
-                game_id=context['game_id'],
-                character_id=context['character_id'],
-                context=context,
-                response=response.dict()
+            return build_response(app.current_event, {
+                "error": f"Missing required fields: {missing_fields}"
+            }, 400)
+
+        idempotency_key = (
+            app.current_event.get_header_value('Idempotency-Key')
+            or context.pop('idempotency_key', None)
+        )
+
+        # Async mode: queue the request and return the job id straight away
+        if app.current_event.get_query_string_value('async', 'false').lower() == 'true':
+            callback_url = context.pop('callback_url', None)
+            job = job_service.submit(
+                context,
+                callback_url=callback_url,
+                idempotency_key=idempotency_key
             )
-            logger.info("Interaction stored successfully")
-        except Exception as store_error:
-            logger.error(f"Error storing interaction: {str(store_error)}")
-            # Continue even if storage fails
+            job['status_url'] = f"/jobs/{job['job_id']}"
+            return build_response(app.current_event, job, 202)
         
-        return {
-            "statusCode": 200,
-            "body": json.dumps(response.dict())
-        }
+        deadline = Deadline.for_request(
+            app.lambda_context,
+            app.current_event.get_header_value(DEADLINE_HEADER)
+        )
+        response = process_idempotent_request(
+            context,
+            idempotency_key,
+            process=lambda request: process_dialogue_request(request, deadline)
+        )
+        
+        return build_response(app.current_event, response, 200)
+
+    except DeadlineExceededError as e:
+        logger.warning(f"Request deadline exceeded: {str(e)}")
+        return build_response(app.current_event, {
+            "error": str(e),
+            "type": type(e).__name__
+        }, 503)
+
+    except (IdempotencyInProgressError, ConversationConflictError) as e:
+        logger.warning(f"Request conflict: {str(e)}")
+        return build_response(app.current_event, {
+            "error": str(e),
+            "type": type(e).__name__
+        }, 409)
+
+    except IdempotencyKeyReuseError as e:
+        logger.warning(f"Invalid request: {str(e)}")
+        return build_response(app.current_event, {
+            "error": str(e)
+        }, 422)
+
+    except InvalidCallbackError as e:
+        logger.warning(f"Rejected callback URL: {str(e)}")
+        return build_response(app.current_event, {
+            "error": str(e)
+        }, 400)
         
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
-        return {
-            "statusCode": 500,
-            "body": json.dumps({
-                "error": "Internal server error",
-                "details": str(e),
-                "type": type(e).__name__
-            })
-        }
\ No newline at end of file
+        return build_response(app.current_event, {
+            "error": "Internal server error",
+            "details": str(e),
+            "type": type(e).__name__
+        }, 500)
+
+@app.post("/generate-scene")
+@tracer.capture_method
+def handle_scene_generation():
+    """
+    Generate a group conversation: the player addresses several NPCs at once
+
+    Body: the /generate-dialogue fields with character_ids (a list) in place
+    of character_id.
+    """
+    try:
+        logger.info("Received scene generation request")
+        context = app.current_event.json_body
+
+        missing_fields = [field for field in SCENE_REQUIRED_FIELDS if field not in context]
+        if missing_fields:
+            logger.error(f"Missing required fields: {missing_fields}")
+            return build_response(app.current_event, {
+                "error": f"Missing required fields: {missing_fields}"
+            }, 400)
+
+        character_ids = context['character_ids']
+        if (not isinstance(character_ids, list) or not character_ids
+                or len(character_ids) > MAX_SCENE_CHARACTERS
+                or not all(isinstance(character, str) and character for character in character_ids)
+                or len(set(character_ids)) != len(character_ids)):
+            return build_response(app.current_event, {
+                "error": f"character_ids must list 1 to {MAX_SCENE_CHARACTERS} distinct character ids"
+            }, 400)
+
+        idempotency_key = (
+            app.current_event.get_header_value('Idempotency-Key')
+            or context.pop('idempotency_key', None)
+        )
+        response = process_idempotent_request(context, idempotency_key, process=process_scene_request)
+
+        return build_response(app.current_event, response, 200)
+
+    except (IdempotencyInProgressError, ConversationConflictError) as e:
+        logger.warning(f"Request conflict: {str(e)}")
+        return build_response(app.current_event, {
+            "error": str(e),
+            "type": type(e).__name__
+        }, 409)
+
+    except IdempotencyKeyReuseError as e:
+        logger.warning(f"Invalid request: {str(e)}")
+        return build_response(app.current_event, {
+            "error": str(e)
+        }, 422)
+
+    except Exception as e:
+        logger.error(f"Error processing scene request: {str(e)}", exc_info=True)
+        return build_response(app.current_event, {
+            "error": "Internal server error",
+            "details": str(e),
+            "type": type(e).__name__
+        }, 500)
+
+MAX_PREFETCH_CHARACTERS = 5
+# Kept across invocations so its threads reuse their DynamoDB tables
+prefetch_pool = ThreadPoolExecutor(max_workers=MAX_PREFETCH_CHARACTERS, thread_name_prefix='prefetch')
+
+def _prefetch_speculative_response(context: Dict):
+    # Read first: a turn stored during generation leaves the greeting behind it
+    turn = dialogue_generator.sequencer.current_turn(
+        dialogue_generator._create_composite_key(context['game_id'], context['character_id'])
+    )
+    response = dialogue_generator.generate_dialogue(context)
+    dialogue_generator.speculative_responses.put(
+        context['game_id'],
+        context['character_id'],
+        context['player_message'],
+        context['game_state'],
+        response.dict(),
+        turn
+    )
+    return context['character_id']
+
+@app.post("/prefetch")
+@tracer.capture_method
+def handle_prefetch():
+    """
+    Warm NPC conversations the player is about to start
+
+    Body: game_id, character_ids and location, plus optionally the request
+    fields of the anticipated first turn (expected_message, game_state, ...)
+    to generate a speculative greeting for each NPC.
+    """
+    try:
+        body = app.current_event.json_body
+        character_ids = body.get('character_ids') or []
+        if 'game_id' not in body or not isinstance(character_ids, list) or not character_ids:
+            return build_response(app.current_event, {
+                "error": "Required fields: game_id, character_ids"
+            }, 400)
+        character_ids = character_ids[:MAX_PREFETCH_CHARACTERS]
+
+        # Speculative greetings first: generating one reads the conversation
+        # context itself, and warming afterwards leaves it in place for the turn
+        speculative = []
+        if body.get('expected_message') and isinstance(body.get('game_state'), dict):
+            base_context = {
+                key: value for key, value in body.items()
+                if key not in ('character_ids', 'expected_message')
+            }
+            contexts = [
+                {**base_context, 'character_id': character_id,
+                 'player_message': body['expected_message']}
+                for character_id in character_ids
+            ]
+            futures = [prefetch_pool.submit(_prefetch_speculative_response, c) for c in contexts]
+            for future in futures:
+                try:
+                    speculative.append(future.result())
+                except Exception as e:
+                    logger.warning(f"Speculative greeting failed: {str(e)}")
+
+        for character_id in character_ids:
+            dialogue_generator.warm_conversation(body['game_id'], character_id)
+
+        logger.info(f"Prefetched {len(character_ids)} conversation(s) at {body.get('location', 'unknown')}")
+        return build_response(app.current_event, {
+            "warmed": character_ids,
+            "speculative": speculative
+        }, 200)
+
+    except Exception as e:
+        logger.error(f"Error processing prefetch: {str(e)}", exc_info=True)
+        return build_response(app.current_event, {
+            "error": "Internal server error",
+            "details": str(e),
+            "type": type(e).__name__
+        }, 500)
+
+MAX_HISTORY_PAGE = 100
+
+@app.get("/chat-history/<character_id>")
+@tracer.capture_method
+def handle_chat_history(character_id: str):
+    """
+    Page through a conversation's history, newest page first
+
+    Query parameters: game_id (required), limit, before (timestamp cursor)
+    """
+    try:
+        game_id = app.current_event.get_query_string_value('game_id')
+        if not game_id:
+            return build_response(app.current_event, {
+                "error": "Missing required query parameter: game_id"
+            }, 400)
+        limit = min(int(app.current_event.get_query_string_value('limit', '20')), MAX_HISTORY_PAGE)
+        before = app.current_event.get_query_string_value('before')
+
+        history = dialogue_generator.get_history_page(game_id, character_id, limit, before)
+        conversations = [
+            {
+                "timestamp": item['timestamp'],
+                "turn": item.get('turn'),
+                "player_message": item.get('context', {}).get('player_message'),
+                "response": item.get('response')
+            }
+            for item in reversed(history)  # Chronological order
+        ]
+
+        return build_response(app.current_event, {
+            "game_id": game_id,
+            "character_id": character_id,
+            "conversations": conversations,
+            "next_before": history[-1]['timestamp'] if len(history) == limit else None
+        }, 200)
+
+    except ValueError as e:
+        return build_response(app.current_event, {
+            "error": f"Invalid query parameter: {str(e)}"
+        }, 400)
+
+    except Exception as e:
+        logger.error(f"Error retrieving chat history: {str(e)}", exc_info=True)
+        return build_response(app.current_event, {
+            "error": "Internal server error",
+            "details": str(e),
+            "type": type(e).__name__
+        }, 500)
+
+@app.get("/jobs/<job_id>")
+@tracer.capture_method
+def handle_job_status(job_id: str):
+    try:
+        job = job_service.get(job_id)
+        if job is None:
+            return build_response(app.current_event, {
+                "error": f"Job not found: {job_id}"
+            }, 404)
+
+        return build_response(app.current_event, job, 200)
+
+    except Exception as e:
+        logger.error(f"Error retrieving job {job_id}: {str(e)}", exc_info=True)
+        return build_response(app.current_event, {
+            "error": "Internal server error",
+            "details": str(e),
+            "type": type(e).__name__
+        }, 500)
\ No newline at end of file
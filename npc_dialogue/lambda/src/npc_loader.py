@@ -3,17 +3,22 @@ NPC Loader Module
 Handles loading and managing NPC data from DynamoDB
 """
 
-import boto3
 from typing import Dict, Optional
 from aws_lambda_powertools import Logger
 import os
+from .cache import TTLCache
+from .concurrency import ThreadLocalTable
 
 logger = Logger()
 
+# Cached in place of NPCs that aren't in the table, so unknown ids don't hit it every turn
+_NOT_FOUND = object()
+
 class NPCLoader:
     def __init__(self):
-        self.dynamodb = boto3.resource('dynamodb')
-        self.table = self.dynamodb.Table(os.environ['NPC_DATA_TABLE'])
+        self.table = ThreadLocalTable(os.environ['NPC_DATA_TABLE'])
+        # NPC data only changes when the initialization script is re-run
+        self.cache = TTLCache(ttl_seconds=int(os.environ.get('NPC_CACHE_TTL', '300')))
     
     def get_npc_background(self, character_id: str) -> Optional[Dict]:
         """
@@ -25,6 +30,12 @@ class NPCLoader:
         Returns:
             Dict containing NPC data or None if not found
         """
+        cached = self.cache.get(character_id)
+        if cached is _NOT_FOUND:
+            return None
+        if cached is not None:
+            return cached
+
         try:
             response = self.table.get_item(
                 Key={'character_id': character_id}
@@ -32,9 +43,11 @@ class NPCLoader:
             
             if 'Item' in response:
                 logger.info(f"Retrieved NPC data for {character_id}")
+                self.cache.set(character_id, response['Item'])
                 return response['Item']
             else:
                 logger.warning(f"No NPC data found for {character_id}")
+                self.cache.set(character_id, _NOT_FOUND)
                 return None
                 
         except Exception as e:
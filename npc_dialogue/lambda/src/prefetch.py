@@ -0,0 +1,119 @@
+"""
+Prefetch Module
+Keeps speculative NPC greetings generated ahead of the player's first message
+
+A speculative response is stored in the chat history table (so any container
+can serve it) and in the container cache. It is only served when the player's
+message, game state and conversation turn match what it was generated for, and
+at most once.
+"""
+
+import json
+import re
+from datetime import datetime
+from typing import Dict, Optional
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+from .cache import TTLCache
+
+logger = Logger()
+
+SPECULATIVE_SORT_KEY = 'speculative'
+
+
+def normalize_message(message: str) -> str:
+    """Case, punctuation and whitespace insensitive form of a player message"""
+    return ' '.join(re.findall(r'[a-z0-9]+', message.lower()))
+
+
+class SpeculativeResponseStore:
+    """
+    Short-lived speculative responses keyed by game_id#character_id
+
+    Args:
+        table: The chat history DynamoDB table
+        ttl_seconds: How long a speculative response may be served
+    """
+
+    def __init__(self, table, ttl_seconds: int = 120):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.cache = TTLCache(ttl_seconds=ttl_seconds)
+
+    def _key(self, game_id: str, character_id: str) -> Dict:
+        # Separate partition from the conversation so history queries never see it
+        return {
+            'composite_key': f"{game_id}#{character_id}#prefetch",
+            'timestamp': SPECULATIVE_SORT_KEY
+        }
+
+    def put(self, game_id: str, character_id: str, player_message: str,
+            game_state: Dict, response: Dict, turn: int):
+        """
+        Store a response generated for an expected player message
+
+        Args:
+            turn: Turns recorded in the conversation when generation started
+        """
+        expires_at = int(datetime.utcnow().timestamp() + self.ttl_seconds)
+        entry = {
+            'message': normalize_message(player_message),
+            'game_state': json.dumps(game_state, sort_keys=True),
+            'turn': turn,
+            'response': json.dumps(response),
+            'expires_at': expires_at
+        }
+        self.cache.set((game_id, character_id), entry)
+        self.table.put_item(Item={
+            **self._key(game_id, character_id),
+            **entry,
+            'ttl': expires_at  # DynamoDB TTL is lazy; expires_at is checked on read
+        })
+
+    def take(self, game_id: str, character_id: str, player_message: str,
+             game_state: Dict, turn: int, check_shared: bool = False) -> Optional[Dict]:
+        """
+        Claim the speculative response if it matches this turn
+
+        The shared record is only read when check_shared is set (the client says
+        it prefetched), so ordinary turns don't pay for an extra lookup. It is
+        deleted conditionally, so only one request can serve it even if it was
+        cached in several containers.
+
+        Returns:
+            The stored response dict, or None if there is no usable match
+        """
+        entry = self.cache.pop((game_id, character_id))
+        try:
+            if entry is None:
+                if not check_shared:
+                    return None
+                item = self.table.get_item(Key=self._key(game_id, character_id)).get('Item')
+                if not item:
+                    return None
+                entry = item
+
+            if int(entry['expires_at']) < datetime.utcnow().timestamp():
+                return None
+            if entry['message'] != normalize_message(player_message):
+                return None
+            if entry['game_state'] != json.dumps(game_state, sort_keys=True):
+                return None
+            if int(entry.get('turn', -1)) != turn:
+                return None  # The conversation moved on since it was generated
+
+            self.table.delete_item(
+                Key=self._key(game_id, character_id),
+                ConditionExpression='attribute_exists(composite_key)'
+            )
+            logger.info(f"Serving speculative response for {game_id}#{character_id}")
+            return json.loads(entry['response'])
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return None  # Already served by another request
+            logger.error(f"Error reading speculative response: {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"Error reading speculative response: {str(e)}")
+            return None
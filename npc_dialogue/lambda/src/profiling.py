@@ -0,0 +1,192 @@
+"""
+Profiling Module
+On-demand CPU and allocation profiling of Lambda invocations
+
+A request is profiled when:
+- it is sampled (PROFILE_SAMPLE_RATE, a fraction between 0 and 1), or
+- it carries an `X-Profile` header equal to PROFILE_TOKEN (header profiling is
+  disabled while PROFILE_TOKEN is unset)
+
+Profiled requests run under cProfile and, unless PROFILE_TRACEMALLOC=false,
+tracemalloc. The top frames (by cumulative and by own time) and allocation
+sites are logged as one structured line. When PROFILE_OUTPUT_DIR is set, the
+full profile is also written there in pstats format (readable with
+`python -m pstats` or snakeviz).
+
+With sampling off and no token configured the wrapper is a single check per
+request.
+"""
+
+import cProfile
+import functools
+import hmac
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+PROFILE_HEADER = 'x-profile'
+TOTTIME, CUMTIME = 2, 3  # Columns of a pstats entry
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class RequestProfiler:
+    """
+    Decides which invocations to profile and reports on them
+
+    Args:
+        sample_rate: Fraction of invocations profiled without a header
+        token: Value of the X-Profile header that forces profiling
+        output_dir: Directory for pstats files; None to only log the summary
+        top_n: Number of frames and allocation sites in the summary
+        trace_allocations: Also run tracemalloc
+    """
+
+    def __init__(self, sample_rate: float = 0.0, token: Optional[str] = None,
+                 output_dir: Optional[str] = None, top_n: int = 15,
+                 trace_allocations: bool = True):
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.token = token or None
+        self.output_dir = output_dir or None
+        self.top_n = top_n
+        self.trace_allocations = trace_allocations
+        self.enabled = self.sample_rate > 0 or self.token is not None
+        # cProfile and tracemalloc are process-wide; one profiled call at a time
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RequestProfiler':
+        return cls(
+            sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+            token=os.environ.get('PROFILE_TOKEN'),
+            output_dir=os.environ.get('PROFILE_OUTPUT_DIR'),
+            top_n=int(os.environ.get('PROFILE_TOP_N', '15')),
+            trace_allocations=_env_flag('PROFILE_TRACEMALLOC', True)
+        )
+
+    def _requested(self, event: Any) -> bool:
+        if self.token is None or not isinstance(event, dict):
+            return False
+        headers = event.get('headers') or {}
+        value = next((v for k, v in headers.items() if k.lower() == PROFILE_HEADER), None)
+        return value is not None and hmac.compare_digest(str(value), self.token)
+
+    def should_profile(self, event: Any) -> bool:
+        if self._requested(event):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def wrap(self, handler: Callable) -> Callable:
+        """Decorate a Lambda handler(event, context)"""
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if not self.enabled or not self.should_profile(event):
+                return handler(event, context)
+            if not self._lock.acquire(blocking=False):
+                return handler(event, context)
+            try:
+                return self._run(handler, event, context)
+            finally:
+                self._lock.release()
+
+        return wrapper
+
+    def _run(self, handler: Callable, event: Any, context: Any) -> Any:
+        profile_id = getattr(context, 'aws_request_id', None) or uuid.uuid4().hex
+        started_tracing = False
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            return handler(event, context)
+        finally:
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            snapshot = None
+            peak_bytes = None
+            if started_tracing:
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+            try:
+                self._report(profile_id, event, profiler, elapsed_ms, snapshot, peak_bytes)
+            except Exception as e:
+                logger.warning(f"Error reporting profile {profile_id}: {str(e)}")
+
+    def _report(self, profile_id: str, event: Any, profiler: cProfile.Profile,
+                elapsed_ms: float, snapshot, peak_bytes: Optional[int]):
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        summary: Dict[str, Any] = {
+            'profile_id': profile_id,
+            'path': event.get('path') if isinstance(event, dict) else None,
+            'elapsed_ms': round(elapsed_ms, 2),
+            'total_calls': stats.total_calls,
+            'top_cumulative': self._top_frames(stats, CUMTIME),
+            'top_self': self._top_frames(stats, TOTTIME)
+        }
+        if snapshot is not None:
+            summary['peak_memory_kb'] = round(peak_bytes / 1024, 1)
+            summary['top_allocations'] = self._top_allocations(snapshot)
+
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{profile_id}.prof")
+            stats.dump_stats(path)
+            summary['profile_file'] = path
+
+        logger.info("Request profile", extra={'profile': summary})
+
+    def _top_frames(self, stats: pstats.Stats, column: int) -> List[Dict]:
+        frames = []
+        # stats.stats maps (file, line, function) -> (primitive calls, calls, tottime, cumtime, callers)
+        ranked = sorted(stats.stats.items(), key=lambda entry: entry[1][column], reverse=True)
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in ranked[:self.top_n]:
+            frames.append({
+                'frame': f"{os.path.basename(filename)}:{line}({function})",
+                'calls': calls,
+                'tottime_ms': round(tottime * 1000, 3),
+                'cumtime_ms': round(cumtime * 1000, 3)
+            })
+        return frames
+
+    def _top_allocations(self, snapshot) -> List[Dict]:
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)
+        ])
+        allocations = []
+        for stat in snapshot.statistics('lineno')[:self.top_n]:
+            frame = stat.traceback[0]
+            allocations.append({
+                'site': f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                'size_kb': round(stat.size / 1024, 1),
+                'count': stat.count
+            })
+        return allocations
+
+
+profiler = RequestProfiler.from_env()
+
+
+def profiled(handler: Callable) -> Callable:
+    """Profile sampled or explicitly requested invocations of a Lambda handler"""
+    return profiler.wrap(handler)
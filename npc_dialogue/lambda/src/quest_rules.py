@@ -0,0 +1,146 @@
+"""
+Quest Rules Module
+Applies declarative quest transitions instead of model-generated game states
+
+Each NPC's allowed transitions come from data/quest_transitions.json, stored on
+the NPC record as `quest_transitions` by the initialization script:
+
+    {"id": "trade_meat",
+     "description": "When the transition applies, for the model",
+     "requires": {"meat_quest": ["unknown", "started"]},
+     "sets": {"meat_quest": "complete", "map_quest": "started"}}
+
+The model only names the transition an interaction triggers. The engine
+checks that it belongs to an NPC in the conversation and that its
+preconditions hold, then applies it. Anything else is rejected, so the
+model can't invent state jumps.
+
+NPCs without a `quest_transitions` attribute keep the older behaviour in
+which the model returns the whole game state.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+NO_TRANSITION = 'none'
+
+
+class QuestRuleEngine:
+    """
+    Validates and applies the quest transitions NPCs may trigger
+
+    Args:
+        npc_loader: NPCLoader providing the NPC records (cached)
+        quests: Quest names in the game state
+        states: Valid quest states
+    """
+
+    def __init__(self, npc_loader, quests: Iterable[str], states: Iterable[str]):
+        self.npc_loader = npc_loader
+        self.quests = set(quests)
+        self.states = set(states)
+
+    def transitions_for(self, character_id: str) -> Optional[List[Dict]]:
+        """
+        The NPC's transition table
+
+        Returns:
+            List of transitions (possibly empty), or None if the NPC has no table
+        """
+        npc = self.npc_loader.get_npc_background(character_id)
+        if not isinstance(npc, dict) or 'quest_transitions' not in npc:
+            return None
+        return [
+            {**transition, 'character_id': character_id}
+            for transition in npc['quest_transitions'] or []
+            if self._is_valid(transition, character_id)
+        ]
+
+    def uses_rules(self, character_ids: Iterable[str]) -> bool:
+        """True if every NPC in the conversation has a transition table"""
+        return all(self.transitions_for(character_id) is not None for character_id in character_ids)
+
+    def _is_valid(self, transition: Dict, character_id: str) -> bool:
+        sets = transition.get('sets') or {}
+        valid = (
+            bool(transition.get('id'))
+            and bool(sets)
+            and all(quest in self.quests and state in self.states for quest, state in sets.items())
+        )
+        if not valid:
+            logger.warning(f"Ignoring invalid quest transition for {character_id}: {transition}")
+        return valid
+
+    @staticmethod
+    def _allows(transition: Dict, game_state: Dict) -> bool:
+        for quest, allowed in (transition.get('requires') or {}).items():
+            if isinstance(allowed, str):
+                allowed = [allowed]
+            if game_state.get(quest, 'unknown') not in allowed:
+                return False
+        return True
+
+    def available(self, character_ids: Iterable[str], game_state: Dict) -> List[Dict]:
+        """Transitions of these NPCs whose preconditions hold in the game state"""
+        return [
+            transition
+            for character_id in character_ids
+            for transition in self.transitions_for(character_id) or []
+            if self._allows(transition, game_state)
+        ]
+
+    @staticmethod
+    def describe(transitions: List[Dict], with_speaker: bool = False) -> str:
+        """Render transitions for the prompt"""
+        lines = []
+        for transition in transitions:
+            effects = ", ".join(f"{quest} to {state}" for quest, state in transition['sets'].items())
+            speaker = f" ({transition['character_id']})" if with_speaker else ""
+            lines.append(f"- {transition['id']}{speaker}: {transition.get('description', '')} Sets {effects}.")
+        return "\n".join(lines)
+
+    @staticmethod
+    def parse_ids(text: str) -> List[str]:
+        """Transition ids named on the first line of a TRANSITION answer"""
+        first_line = text.strip().split('\n', 1)[0] if text else ''
+        return [
+            transition_id for transition_id in re.findall(r'[A-Za-z0-9_\-]+', first_line)
+            if transition_id.lower() != NO_TRANSITION
+        ]
+
+    def apply(self, character_ids: List[str], transition_ids: List[str],
+              game_state: Dict) -> Tuple[Dict, List[str], List[str]]:
+        """
+        Apply the named transitions in order, rejecting any that aren't allowed
+
+        Args:
+            character_ids: NPCs in the conversation; only their transitions apply
+            transition_ids: Transition ids named by the model
+            game_state: Game state the request was made with
+
+        Returns:
+            The new game state, the applied ids and the rejected ids
+        """
+        known = {
+            transition['id']: transition
+            for character_id in character_ids
+            for transition in self.transitions_for(character_id) or []
+        }
+        new_state = dict(game_state)
+        applied, rejected = [], []
+        for transition_id in transition_ids:
+            transition = known.get(transition_id)
+            if transition is None or transition_id in applied or not self._allows(transition, new_state):
+                rejected.append(transition_id)
+                continue
+            new_state.update(transition['sets'])
+            applied.append(transition_id)
+
+        if rejected:
+            logger.warning(f"Rejected quest transitions {rejected} for {', '.join(character_ids)}")
+        if applied:
+            logger.info(f"Applied quest transitions {applied} for {', '.join(character_ids)}")
+        return new_state, applied, rejected
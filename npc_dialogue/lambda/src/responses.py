@@ -0,0 +1,149 @@
+"""
+Responses Module
+Builds HTTP responses for the API with content negotiation
+
+- JSON bodies are returned flat (one parse on the client) by default
+- `Accept: application/msgpack` returns MessagePack when msgpack is installed
+- Bodies above COMPRESSION_THRESHOLD (batch and history responses in practice)
+  are compressed with br or gzip per Accept-Encoding, unless
+  COMPRESS_RESPONSES=false (behind API Gateway, which compresses by itself)
+- `X-Response-Format: legacy` (or `?format=legacy`) keeps the old shape, a 200
+  whose JSON body holds `statusCode` and a JSON-encoded `body` string
+"""
+
+import base64
+import gzip
+import json
+import os
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from aws_lambda_powertools.event_handler import Response
+from aws_lambda_powertools.utilities.data_classes.common import BaseProxyEvent
+
+try:
+    import msgpack
+except ImportError:  # Optional: MessagePack is only offered when installed
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # Optional: br is only offered when installed
+    brotli = None
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack')
+COMPRESSION_THRESHOLD = 1024  # Smaller bodies aren't worth the CPU
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'true').lower() != 'false'
+
+
+def _default(value: Any) -> Any:
+    """Serialize values DynamoDB hands back (numbers come out as Decimal)"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, set):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _accepted(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept or Accept-Encoding header into {value: quality}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        fields = [field.strip() for field in part.split(';')]
+        if not fields[0]:
+            continue
+        quality = 1.0
+        for field in fields[1:]:
+            if field.startswith('q='):
+                try:
+                    quality = float(field[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[fields[0].lower()] = quality
+    return accepted
+
+
+def is_legacy_format(event: BaseProxyEvent) -> bool:
+    return (
+        (event.get_header_value('X-Response-Format') or '').lower() == 'legacy'
+        or (event.get_query_string_value('format') or '').lower() == 'legacy'
+    )
+
+
+def build_response(event: BaseProxyEvent, payload: Any, status_code: int = 200) -> Response:
+    """
+    Serialize a payload for the client that sent the event
+
+    Args:
+        event: The current API Gateway event (for Accept headers and format opt-in)
+        payload: JSON-compatible response data
+        status_code: HTTP status code
+
+    Returns:
+        Powertools Response; binary bodies are base64 encoded by the resolver
+    """
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+
+    if is_legacy_format(event):
+        body: Any = json.dumps({
+            "statusCode": status_code,
+            "body": json.dumps(payload, default=_default)
+        })
+        return Response(status_code=200, content_type=JSON_CONTENT_TYPE, body=body,
+                        headers=headers)
+
+    accept = _accepted(event.get_header_value('Accept'))
+    msgpack_type = next((t for t in MSGPACK_CONTENT_TYPES if accept.get(t, 0) > 0), None)
+    if msgpack is not None and msgpack_type:
+        content_type = msgpack_type
+        body = msgpack.packb(payload, default=_default, use_bin_type=True)
+    else:
+        content_type = JSON_CONTENT_TYPE
+        body = json.dumps(payload, default=_default, separators=(',', ':'))
+
+    return Response(status_code=status_code, content_type=content_type, body=body,
+                    headers=headers)
+
+
+def compress_response(result: Dict, event: Dict) -> Dict:
+    """
+    Compress a resolved API Gateway proxy response if the client accepts it
+
+    Applied after the resolver has built the response, since the resolver
+    would re-serialize a compressed JSON body.
+
+    Args:
+        result: Response dict returned by the resolver
+        event: The raw API Gateway event
+
+    Returns:
+        The response, with a base64-encoded compressed body when worthwhile
+    """
+    body = result.get('body')
+    if not COMPRESS_RESPONSES or not body or len(body) < COMPRESSION_THRESHOLD:
+        return result
+
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    encodings = _accepted(headers.get('accept-encoding'))
+    if brotli is not None and encodings.get('br', 0) > 0:
+        encoding, compress = 'br', brotli.compress
+    elif encodings.get('gzip', 0) > 0:
+        encoding, compress = 'gzip', lambda raw: gzip.compress(raw, compresslevel=6)
+    else:
+        return result
+
+    if 'multiValueHeaders' in result:
+        response_headers = result['multiValueHeaders']
+        if any(k.lower() == 'content-encoding' for k in response_headers):
+            return result
+        response_headers['Content-Encoding'] = [encoding]
+    else:
+        response_headers = result.setdefault('headers', {})
+        if any(k.lower() == 'content-encoding' for k in response_headers):
+            return result
+        response_headers['Content-Encoding'] = encoding
+
+    raw = base64.b64decode(body) if result.get('isBase64Encoded') else body.encode('utf-8')
+    result['body'] = base64.b64encode(compress(raw)).decode()
+    result['isBase64Encoded'] = True
+    return result
@@ -0,0 +1,186 @@
+"""
+World Digest Module
+Maintains a per-game digest of world events so NPCs can share knowledge
+
+Interactions that change quest state fold the transitions, and what the player
+said to bring them about, into a single bounded, deduplicated record per game.
+Small talk is left out, so the digest only carries notable events. Prompts read
+the whole digest with one get_item instead of querying every NPC's history.
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Sequence
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+DIGEST_CHARACTER_ID = '__world__'
+DIGEST_SORT_KEY = 'digest'
+
+
+class WorldDigest:
+    """
+    Per-game digest record stored alongside the chat history
+
+    The record lives under the `game_id#__world__` key and deliberately has no
+    game_id attribute, so it never shows up in GameIdIndex queries.
+
+    Args:
+        table: The chat history DynamoDB table
+        max_events: Maximum number of events kept per game
+        max_told_per_character: Maximum player statements kept per NPC
+        max_text_length: Player statements are truncated to this many characters
+    """
+
+    def __init__(self, table, max_events: int = 20, max_told_per_character: int = 2,
+                 max_text_length: int = 160):
+        self.table = table
+        self.max_events = max_events
+        self.max_told_per_character = max_told_per_character
+        self.max_text_length = max_text_length
+
+    def _key(self, game_id: str) -> Dict:
+        return {
+            'composite_key': f"{game_id}#{DIGEST_CHARACTER_ID}",
+            'timestamp': DIGEST_SORT_KEY
+        }
+
+    def get(self, game_id: str, consistent: bool = False) -> Dict:
+        """
+        Retrieve the digest for a game
+
+        Returns:
+            Dict with `events` and `version`; empty when nothing has been recorded yet
+        """
+        try:
+            response = self.table.get_item(Key=self._key(game_id), ConsistentRead=consistent)
+            item = response.get('Item')
+            if item:
+                return {'events': item.get('events', []), 'version': int(item.get('version', 0))}
+        except Exception as e:
+            logger.error(f"Error retrieving world digest for {game_id}: {str(e)}")
+        return {'events': [], 'version': 0}
+
+    def record_interaction(self, game_id: str, character_id: str, context: Dict, response: Dict,
+                           max_retries: int = 3):
+        """
+        Fold an interaction into the game's digest
+
+        Uses optimistic concurrency on the `version` attribute so concurrent
+        turns with different NPCs don't overwrite each other's events.
+        """
+        new_events = self.extract_events(character_id, context, response)
+        if not new_events:
+            return
+
+        for _ in range(max_retries):
+            digest = self.get(game_id, consistent=True)
+            events = self.merge_events(digest['events'], new_events)
+            try:
+                self.table.put_item(
+                    Item={
+                        **self._key(game_id),
+                        'events': events,
+                        'version': digest['version'] + 1,
+                        'ttl': int(datetime.utcnow().timestamp() + (30 * 24 * 60 * 60))
+                    },
+                    ConditionExpression='attribute_not_exists(composite_key) OR version = :version',
+                    ExpressionAttributeValues={':version': digest['version']}
+                )
+                logger.info(f"Updated world digest for {game_id} with {len(new_events)} event(s)")
+                return
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                logger.info(f"World digest for {game_id} changed concurrently, retrying")
+
+        logger.warning(f"Gave up updating world digest for {game_id} after {max_retries} attempts")
+
+    def extract_events(self, character_id: str, context: Dict, response: Dict) -> List[Dict]:
+        """
+        Derive digest events from an interaction
+
+        Returns:
+            The quest transitions, followed by the player's statement that led to
+            them; empty when no quest changed state
+        """
+        timestamp = datetime.utcnow().isoformat()
+        events = []
+
+        old_state = context.get('game_state') or {}
+        new_state = response.get('game_state') or {}
+        if isinstance(old_state, dict):
+            for quest, state in new_state.items():
+                previous = old_state.get(quest, 'unknown')
+                if state != previous:
+                    events.append(self._event('quest', character_id, timestamp,
+                                              f"{quest}: {previous} -> {state}"))
+
+        if not events:
+            return events
+
+        message = ' '.join(str(context.get('player_message', '')).split())
+        if message:
+            if len(message) > self.max_text_length:
+                message = message[:self.max_text_length - 3].rstrip() + '...'
+            events.append(self._event('told', character_id, timestamp, message))
+
+        return events
+
+    def _event(self, event_type: str, character_id: str, timestamp: str, text: str) -> Dict:
+        fingerprint = f"{event_type}|{character_id}|{text.lower()}"
+        return {
+            'id': hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:12],
+            'type': event_type,
+            'character_id': character_id,
+            'text': text,
+            'timestamp': timestamp
+        }
+
+    def merge_events(self, events: List[Dict], new_events: List[Dict]) -> List[Dict]:
+        """
+        Append new events, dropping duplicates and enforcing the size bounds
+
+        A repeated event moves to the end with its new timestamp. Player
+        statements are capped per NPC before the overall limit drops the oldest.
+        """
+        new_ids = {event['id'] for event in new_events}
+        merged = [event for event in events if event['id'] not in new_ids] + new_events
+
+        told_counts: Dict[str, int] = {}
+        kept = []
+        for event in reversed(merged):
+            if event['type'] == 'told':
+                count = told_counts.get(event['character_id'], 0)
+                if count >= self.max_told_per_character:
+                    continue
+                told_counts[event['character_id']] = count + 1
+            kept.append(event)
+        kept.reverse()
+
+        return kept[-self.max_events:]
+
+    @staticmethod
+    def format_for_prompt(digest: Dict, character_id: str, present: Sequence[str] = ()) -> str:
+        """
+        Render what the rest of the world has been up to, from this NPC's point of view
+
+        Args:
+            digest: The game's digest
+            character_id: The NPC the prompt is for
+            present: Other NPCs in the same scene, whose events the prompt already covers
+        """
+        lines = []
+        for event in digest.get('events', []):
+            if event['character_id'] == character_id or event['character_id'] in present:
+                continue  # Already covered by the NPC's own conversation history
+            if event['type'] == 'quest':
+                lines.append(f"- After talking with {event['character_id']}, {event['text']}")
+            else:
+                lines.append(f"- The player told {event['character_id']}: \"{event['text']}\"")
+
+        if not lines:
+            return ""
+        return "\n\nWord around the island (things other people have heard):\n" + "\n".join(lines)
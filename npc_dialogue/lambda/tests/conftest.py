@@ -0,0 +1,14 @@
+"""
+Shared pytest setup for the Lambda source
+
+Tests import the Lambda package as `src`, like the handler paths in the CDK stack.
+Run from npc_dialogue/lambda: python -m pytest -q tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('POWERTOOLS_TRACE_DISABLED', '1')
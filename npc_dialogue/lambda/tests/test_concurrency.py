@@ -0,0 +1,150 @@
+import threading
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from src.concurrency import (
+    ConversationConflictError,
+    ConversationSequencer,
+    IdempotencyInProgressError,
+    IdempotencyKeyReuseError,
+    IdempotencyStore,
+    SingleFlight,
+    ThreadLocalTable,
+    request_fingerprint
+)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        yield boto3.resource('dynamodb').create_table(
+            TableName='history',
+            KeySchema=[
+                {'AttributeName': 'composite_key', 'KeyType': 'HASH'},
+                {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'composite_key', 'AttributeType': 'S'},
+                {'AttributeName': 'timestamp', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+
+def turn(composite_key, timestamp, **fields):
+    return {'composite_key': composite_key, 'timestamp': timestamp, **fields}
+
+
+def test_fingerprint_ignores_key_order():
+    assert request_fingerprint({'a': 1, 'b': 2}) == request_fingerprint({'b': 2, 'a': 1})
+    assert request_fingerprint({'a': 1}) != request_fingerprint({'a': 2})
+
+
+def test_single_flight_shares_one_execution():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+    follower.start()
+    follower.join(0.1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == ['result', 'result']
+    assert len(calls) == 1
+
+
+def test_single_flight_shares_errors_and_forgets_the_call():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 'again') == 'again'
+
+
+def test_idempotency_replays_completed_result(table):
+    store = IdempotencyStore(table)
+    assert store.begin('game', 'key-1', 'fp') is None
+    store.complete('game', 'key-1', 'fp', {'dialogue': 'hello'})
+    assert store.begin('game', 'key-1', 'fp') == {'dialogue': 'hello'}
+
+
+def test_idempotency_conflicts(table):
+    store = IdempotencyStore(table)
+    store.begin('game', 'key-1', 'fp')
+    with pytest.raises(IdempotencyInProgressError):
+        store.begin('game', 'key-1', 'fp')
+    with pytest.raises(IdempotencyKeyReuseError):
+        store.begin('game', 'key-1', 'other')
+
+
+def test_idempotency_release_allows_retry(table):
+    store = IdempotencyStore(table)
+    store.begin('game', 'key-1', 'fp')
+    store.release('game', 'key-1')
+    assert store.begin('game', 'key-1', 'fp') is None
+
+
+def test_sequencer_numbers_turns_and_rejects_stale_writes(table):
+    sequencer = ConversationSequencer(table)
+    assert sequencer.current_turn('g#npc') == 0
+    assert sequencer.record_turn('g#npc', 0, turn('g#npc', 't1', ttl=100)) == 1
+    assert sequencer.record_turn('g#npc', 1, turn('g#npc', 't2', ttl=200)) == 2
+
+    with pytest.raises(ConversationConflictError):
+        sequencer.record_turn('g#npc', 1, turn('g#npc', 't3'))
+
+    assert sequencer.current_turn('g#npc') == 2
+    assert 'Item' not in table.get_item(Key={'composite_key': 'g#npc', 'timestamp': 't3'})
+    head = table.get_item(Key={'composite_key': 'g#npc#head', 'timestamp': 'head'})['Item']
+    assert head['ttl'] == 200
+
+
+def test_sequencer_records_scene_turns_all_or_none(table):
+    sequencer = ConversationSequencer(table)
+    sequencer.record_turn('g#b', 0, turn('g#b', 't0'))
+
+    with pytest.raises(ConversationConflictError, match='g#b'):
+        sequencer.record_turns([
+            ('g#a', 0, turn('g#a', 't1')),
+            ('g#b', 0, turn('g#b', 't1'))
+        ])
+    assert sequencer.current_turn('g#a') == 0
+
+    assert sequencer.record_turns([
+        ('g#a', 0, turn('g#a', 't1')),
+        ('g#b', 1, turn('g#b', 't1'))
+    ]) == [1, 2]
+
+
+def test_thread_local_table_gives_each_thread_its_own_table(table):
+    shared = ThreadLocalTable('history')
+    shared.put_item(Item=turn('g1#npc', '2024-01-01T00:00:00'))
+
+    tables = []
+    worker = threading.Thread(target=lambda: tables.append(shared._table()))
+    worker.start()
+    worker.join()
+
+    assert tables[0] is not shared._table()
+    assert tables[0].get_item(Key={'composite_key': 'g1#npc', 'timestamp': '2024-01-01T00:00:00'})['Item']
@@ -0,0 +1,106 @@
+import pytest
+
+from src.deadline import API_GATEWAY_TIMEOUT_MS, Deadline, DeadlineExceededError, DegradationPolicy
+
+POLICY = DegradationPolicy(safety_ms=1000, history_ms=15000, background_ms=12000,
+                           generation_ms=10000, fast_model_ms=6000, write_ms=3000, min_ms=1500,
+                           reduced_max_tokens=250, fast_max_tokens=150)
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def shed_at(remaining_ms, policy=POLICY):
+    """Run every stage the way a request does and return what was shed"""
+    deadline = Deadline(remaining_ms, policy)
+    deadline.skip_history()
+    deadline.knowledge_budget(400)
+    deadline.generation('default-model', 500)
+    deadline.defer_write()
+    return deadline.shed
+
+
+def test_unbounded_deadline_sheds_nothing():
+    deadline = Deadline.unbounded()
+    assert not deadline.skip_history()
+    assert deadline.knowledge_budget(400) == 400
+    assert deadline.generation('default-model', 500) == ('default-model', 500)
+    assert not deadline.defer_write()
+    assert not deadline.degraded
+
+
+@pytest.mark.parametrize('remaining_ms, shed', [
+    (20000, []),
+    (14000, ['history']),
+    (11000, ['history', 'background']),
+    (8000, ['history', 'background', 'max_tokens']),
+    (5000, ['history', 'background', 'short_response']),
+    (2000, ['history', 'background', 'short_response', 'deferred_write'])
+])
+def test_stages_are_shed_in_order(remaining_ms, shed):
+    assert shed_at(remaining_ms) == shed
+
+
+def test_generation_limits_tokens_and_uses_fast_model_when_configured():
+    assert Deadline(8000, POLICY).generation('default-model', 500) == ('default-model', 250)
+    assert Deadline(5000, POLICY).generation('default-model', 500) == ('default-model', 150)
+
+    fast = DegradationPolicy(fast_model_id='fast-model')
+    deadline = Deadline(5000, fast)
+    assert deadline.generation('default-model', 500) == ('fast-model', 150)
+    assert deadline.shed == ['fast_model']
+
+
+def test_generation_gives_up_below_minimum():
+    with pytest.raises(DeadlineExceededError):
+        Deadline(1000, POLICY).generation('default-model', 500)
+
+
+def test_knowledge_budget_is_halved_with_a_floor():
+    assert Deadline(11000, POLICY).knowledge_budget(400) == 200
+    assert Deadline(11000, POLICY).knowledge_budget(120) == 100
+
+
+def test_budget_is_the_tightest_source_less_the_safety_margin():
+    assert Deadline.for_request(FakeContext(60000)).budget_ms == API_GATEWAY_TIMEOUT_MS - 1000
+    assert Deadline.for_request(FakeContext(9000)).budget_ms == 8000
+    assert Deadline.for_request(FakeContext(9000), '4000').budget_ms == 3000
+    assert Deadline.for_request(None, 'soon').budget_ms == API_GATEWAY_TIMEOUT_MS - 1000
+
+
+class FakeMetric:
+    def __init__(self, emitted, **kwargs):
+        self.record = {**kwargs, 'dimensions': {}}
+        emitted.append(self.record)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_dimension(self, name, value):
+        self.record['dimensions'][name] = value
+
+    def add_metadata(self, key, value):
+        self.record[key] = value
+
+
+def test_report_emits_only_when_degraded(monkeypatch):
+    emitted = []
+    monkeypatch.setattr('src.deadline.single_metric', lambda **kwargs: FakeMetric(emitted, **kwargs))
+
+    Deadline.unbounded().report('generate-dialogue')
+    assert emitted == []
+
+    deadline = Deadline(14000, POLICY)
+    deadline.skip_history()
+    deadline.report('generate-dialogue')
+    assert emitted[0]['name'] == 'DegradedResponses'
+    assert emitted[0]['dimensions'] == {'route': 'generate-dialogue'}
+    assert emitted[0]['shed'] == 'history'
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+os.environ.setdefault('CHAT_HISTORY_TABLE', 'history')
+os.environ.setdefault('NPC_DATA_TABLE', 'npc')
+
+from src import main  # noqa: E402
+from src.deadline import Deadline  # noqa: E402
+
+CONTEXT = {
+    'game_id': 'g1',
+    'character_id': 'smuggler_rum',
+    'player_message': 'Got any work?',
+    'game_state': {'smuggler_quest': 'unknown'}
+}
+
+
+@pytest.fixture
+def turn(monkeypatch):
+    """A turn generated too late to store before the response is sent"""
+    stored = []
+    monkeypatch.setattr(main.dialogue_generator.sequencer, 'current_turn', lambda composite_key: 3)
+    monkeypatch.setattr(main.dialogue_generator.speculative_responses, 'take', lambda *args, **kwargs: None)
+    monkeypatch.setattr(main.dialogue_generator, 'generate_dialogue',
+                        lambda context, deadline, expected_turn: main.DialogueResponse(
+                            dialogue='Bring rum.', game_state=context['game_state']))
+    monkeypatch.setattr(main.dialogue_generator, 'store_interaction',
+                        lambda **kwargs: stored.append(kwargs))
+    return stored
+
+
+def fail_defer(task, payload):
+    raise RuntimeError('SQS unavailable')
+
+
+def test_write_is_deferred_when_out_of_time(turn, monkeypatch):
+    deferred = []
+    monkeypatch.setattr(main.job_service, 'defer', lambda task, payload: deferred.append(payload))
+
+    response = main.process_dialogue_request(CONTEXT, Deadline(budget_ms=2000))
+
+    assert response['dialogue'] == 'Bring rum.'
+    assert deferred[0]['expected_turn'] == 3
+    assert turn == []
+
+
+def test_failed_deferral_stores_inline(turn, monkeypatch):
+    monkeypatch.setattr(main.job_service, 'defer', fail_defer)
+
+    response = main.process_dialogue_request(CONTEXT, Deadline(budget_ms=2000))
+
+    assert response['dialogue'] == 'Bring rum.'
+    assert turn[0]['expected_turn'] == 3
+    assert 'deferred_write' in turn[0]['metrics']['degraded']
+
+
+def test_dialogue_is_returned_when_no_write_succeeds(turn, monkeypatch):
+    monkeypatch.setattr(main.job_service, 'defer', fail_defer)
+
+    def fail_store(**kwargs):
+        raise RuntimeError('DynamoDB unavailable')
+
+    monkeypatch.setattr(main.dialogue_generator, 'store_interaction', fail_store)
+
+    response = main.process_dialogue_request(CONTEXT, Deadline(budget_ms=2000))
+    assert response['dialogue'] == 'Bring rum.'
@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import threading
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'scripts'))
+import export_analytics  # noqa: E402
+
+
+@pytest.fixture
+def segments(monkeypatch):
+    """Scan segments served from a dict instead of DynamoDB"""
+    sources = {}
+    session = types.SimpleNamespace(
+        resource=lambda name: types.SimpleNamespace(Table=lambda table_name: None)
+    )
+    monkeypatch.setattr(export_analytics, 'boto3', types.SimpleNamespace(Session=lambda **kwargs: session))
+    monkeypatch.setattr(export_analytics, 'scan_segment',
+                        lambda table, segment, total, since, until: sources[segment]())
+    return sources
+
+
+def export_args(tmp_path, segments):
+    return argparse.Namespace(
+        table_name='history', profile=None, region='us-east-1', segments=segments, game_id=None,
+        since=None, until=None, batch_size=100, archive_bucket=None, archive_root=None,
+        output_dir=str(tmp_path)
+    )
+
+
+def endless_pages():
+    while True:
+        yield []
+
+
+def test_failing_reader_stops_the_export(segments, tmp_path):
+    def failing():
+        threading.Event().wait(0.2)  # Let the other readers fill the hand-over queue
+        raise RuntimeError('ProvisionedThroughputExceeded')
+        yield
+
+    segments.update({0: failing, 1: endless_pages, 2: endless_pages})
+    outcome = {}
+
+    def run():
+        try:
+            export_analytics.export(export_args(tmp_path, 3))
+        except Exception as e:
+            outcome['error'] = e
+
+    exporter = threading.Thread(target=run, daemon=True)
+    exporter.start()
+    exporter.join(10)
+
+    assert not exporter.is_alive(), 'export hung after a reader failed'
+    assert str(outcome['error']) == 'ProvisionedThroughputExceeded'
+
+
+def test_stopping_early_releases_readers(segments):
+    segments.update({0: endless_pages, 1: endless_pages})
+    pages = export_analytics.stream_pages('history', None, 'us-east-1', 2, None, None, None)
+
+    next(pages)
+    closer = threading.Thread(target=pages.close, daemon=True)
+    closer.start()
+    closer.join(10)
+
+    assert not closer.is_alive()
@@ -0,0 +1,69 @@
+import pytest
+
+from src.history_archive import HistoryArchive, LocalArchiveStorage
+
+
+def turn(timestamp, game_id='g1', character_id='npc'):
+    return {
+        'composite_key': f"{game_id}#{character_id}",
+        'timestamp': timestamp,
+        'game_id': game_id,
+        'character_id': character_id,
+        'context': {'player_message': f"at {timestamp}"},
+        'response': {'dialogue': 'Aye.'}
+    }
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return HistoryArchive(LocalArchiveStorage(str(tmp_path)))
+
+
+def timestamps(turns):
+    return [t['timestamp'] for t in turns]
+
+
+def test_read_returns_newest_turns_first(archive):
+    archive.write([turn('2024-01-01T01:00:00'), turn('2024-01-02T01:00:00'),
+                   turn('2024-01-03T01:00:00')])
+
+    assert timestamps(archive.read('g1', 'npc', limit=2)) == [
+        '2024-01-03T01:00:00', '2024-01-02T01:00:00'
+    ]
+
+
+def test_read_merges_overlapping_parts(archive):
+    # The sweep and TTL expiry archived the same day separately
+    archive.write([turn('2024-01-01T01:00:00'), turn('2024-01-01T03:00:00')])
+    archive.write([turn('2024-01-01T02:00:00')])
+
+    assert timestamps(archive.read('g1', 'npc', limit=2)) == [
+        '2024-01-01T03:00:00', '2024-01-01T02:00:00'
+    ]
+
+
+def test_read_pages_with_before(archive):
+    archive.write([turn(f"2024-01-0{day}T12:00:00") for day in range(1, 6)])
+    archive.write([turn('2024-01-03T18:00:00')])
+
+    first = archive.read('g1', 'npc', limit=3)
+    second = archive.read('g1', 'npc', before=first[-1]['timestamp'], limit=3)
+
+    assert timestamps(first) == ['2024-01-05T12:00:00', '2024-01-04T12:00:00', '2024-01-03T18:00:00']
+    assert timestamps(second) == ['2024-01-03T12:00:00', '2024-01-02T12:00:00', '2024-01-01T12:00:00']
+
+
+def test_redelivered_batch_is_not_archived_twice(archive):
+    batch = [turn('2024-01-01T01:00:00'), turn('2024-01-01T02:00:00')]
+
+    assert archive.write(batch) == 2
+    assert archive.write(batch) == 0
+    assert len(archive.read('g1', 'npc')) == 2
+
+
+def test_scan_filters_by_game_and_time(archive):
+    archive.write([turn('2024-01-01T01:00:00'), turn('2024-01-02T01:00:00'),
+                   turn('2024-01-02T01:00:00', game_id='g2')])
+
+    scanned = [t for part in archive.scan(game_id='g1', since='2024-01-02') for t in part]
+    assert timestamps(scanned) == ['2024-01-02T01:00:00']
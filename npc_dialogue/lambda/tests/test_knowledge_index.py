@@ -0,0 +1,72 @@
+from src.knowledge_index import KnowledgeIndex, build_index, chunk_npc, strip_state_rules, tokenize
+
+NPCS = {
+    'baker': {
+        'name': 'Ada',
+        'role': 'Baker',
+        'background': (
+            'Ada bakes rye bread every morning. '
+            'She once sailed with the navy and knows the harbor well. '
+            'If the player brings flour, set the potato_quest to complete.'
+        ),
+        'available_wares': ['bread', 'pies']
+    },
+    'smith': {
+        'name': 'Bo',
+        'role': 'Smith',
+        'background': 'Bo forges swords and horseshoes.'
+    }
+}
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize('The Harbor and THE navy') == ['harbor', 'navy']
+
+
+def test_game_state_sentences_are_pinned():
+    chunks = chunk_npc('baker', NPCS['baker'])
+    pinned = [chunk['text'] for chunk in chunks if chunk['pinned']]
+    assert pinned[0].startswith('You are Ada, Baker.')
+    assert 'If the player brings flour, set the potato_quest to complete.' in pinned
+
+
+def test_select_ranks_matching_chunk_and_keeps_pinned():
+    index = KnowledgeIndex(build_index(NPCS))
+    selected = index.select('baker', 'tell me about the harbor', top_k=1)
+    assert selected[0].startswith('You are Ada')
+    assert any('harbor' in text for text in selected)
+    assert not any('Wares for trade' in text for text in selected)
+    assert any('potato_quest' in text for text in selected)
+
+
+def test_select_falls_back_to_earliest_chunks_without_matches():
+    index = KnowledgeIndex(build_index(NPCS))
+    selected = index.select('baker', 'zzz', top_k=1)
+    assert any('rye bread' in text for text in selected)
+
+
+def test_select_respects_token_budget():
+    index = KnowledgeIndex(build_index(NPCS))
+    pinned_only = index.select('baker', 'harbor bread pies', token_budget=0)
+    assert all(chunk['text'] in pinned_only
+               for chunk in index.index['npcs']['baker'] if chunk['pinned'])
+    assert len(pinned_only) == sum(chunk['pinned'] for chunk in index.index['npcs']['baker'])
+
+
+def test_unknown_npc_selects_nothing():
+    index = KnowledgeIndex(build_index(NPCS))
+    assert not index.has_npc('ghost')
+    assert index.select('ghost', 'hello') == []
+
+
+def test_state_rules_can_be_left_out_for_rule_engine_npcs():
+    index = KnowledgeIndex(build_index(NPCS))
+    selected = index.select('baker', 'flour for the potato quest', state_rules=False)
+    assert selected[0].startswith('You are Ada')
+    assert not any('potato_quest' in text for text in selected)
+
+
+def test_strip_state_rules_keeps_other_sentences():
+    text = ("Trade fairly. When you do, update the game state by setting the meat_quest to 'complete'. "
+            "Never reveal the map.")
+    assert strip_state_rules(text) == 'Trade fairly. Never reveal the map.'
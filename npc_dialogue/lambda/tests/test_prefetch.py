@@ -0,0 +1,50 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from src.prefetch import SpeculativeResponseStore
+
+GAME_STATE = {'potato_quest': 'unknown'}
+RESPONSE = {'dialogue': 'Evening, sailor.', 'game_state': GAME_STATE}
+
+
+@pytest.fixture
+def table(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        yield boto3.resource('dynamodb').create_table(
+            TableName='history',
+            KeySchema=[
+                {'AttributeName': 'composite_key', 'KeyType': 'HASH'},
+                {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'composite_key', 'AttributeType': 'S'},
+                {'AttributeName': 'timestamp', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+
+def test_matching_turn_is_served_once(table):
+    store = SpeculativeResponseStore(table)
+    store.put('g1', 'npc', 'Good evening!', GAME_STATE, RESPONSE, turn=2)
+
+    assert store.take('g1', 'npc', 'good evening', GAME_STATE, 2) == RESPONSE
+    assert store.take('g1', 'npc', 'good evening', GAME_STATE, 2, check_shared=True) is None
+
+
+def test_response_is_dropped_once_conversation_moves_on(table):
+    store = SpeculativeResponseStore(table)
+    store.put('g1', 'npc', 'Good evening!', GAME_STATE, RESPONSE, turn=2)
+
+    assert store.take('g1', 'npc', 'Good evening!', GAME_STATE, 3) is None
+
+
+def test_shared_record_is_checked_across_containers(table):
+    SpeculativeResponseStore(table).put('g1', 'npc', 'Good evening!', GAME_STATE, RESPONSE, turn=0)
+    other_container = SpeculativeResponseStore(table)
+
+    assert other_container.take('g1', 'npc', 'Good evening!', GAME_STATE, 0) is None
+    assert other_container.take('g1', 'npc', 'Good evening!', GAME_STATE, 0, check_shared=True) == RESPONSE
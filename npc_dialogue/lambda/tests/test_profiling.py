@@ -0,0 +1,68 @@
+import pstats
+
+import pytest
+
+from src.profiling import RequestProfiler
+
+
+def handler(event, context):
+    return sum(range(1000))
+
+
+def test_disabled_profiler_calls_handler_directly():
+    profiler = RequestProfiler()
+    assert not profiler.enabled
+    assert profiler.wrap(handler)({'headers': {'X-Profile': 'anything'}}, None) == 499500
+
+
+def test_header_must_match_token():
+    profiler = RequestProfiler(token='secret')
+    assert profiler.should_profile({'headers': {'x-profile': 'secret'}})
+    assert not profiler.should_profile({'headers': {'X-Profile': 'wrong'}})
+    assert not profiler.should_profile({'headers': {}})
+    assert not profiler.should_profile('not an API event')
+
+
+def test_sample_rate_is_clamped():
+    assert RequestProfiler(sample_rate=5).sample_rate == 1.0
+    assert RequestProfiler(sample_rate=-1).sample_rate == 0.0
+    assert RequestProfiler(sample_rate=1).should_profile({})
+
+
+def test_profiled_call_writes_pstats_file(tmp_path):
+    profiler = RequestProfiler(sample_rate=1, output_dir=str(tmp_path), top_n=3)
+
+    class Context:
+        aws_request_id = 'request-1'
+
+    assert profiler.wrap(handler)({'path': '/generate-dialogue'}, Context()) == 499500
+    path = tmp_path / 'request-1.prof'
+    assert path.exists()
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+def test_report_lists_top_frames_and_allocations(monkeypatch):
+    profiler = RequestProfiler(sample_rate=1, top_n=2)
+    reports = []
+    monkeypatch.setattr('src.profiling.logger.info',
+                        lambda message, extra=None: reports.append(extra['profile']))
+
+    profiler.wrap(handler)({'path': '/prefetch'}, None)
+
+    summary = reports[0]
+    assert summary['path'] == '/prefetch'
+    assert len(summary['top_cumulative']) <= 2
+    assert len(summary['top_self']) <= 2
+    assert 'peak_memory_kb' in summary
+    assert not any(allocation['site'].startswith('profiling.py')
+                   for allocation in summary['top_allocations'])
+
+
+def test_handler_errors_propagate():
+    profiler = RequestProfiler(sample_rate=1, trace_allocations=False)
+
+    def failing(event, context):
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError, match='boom'):
+        profiler.wrap(failing)({}, None)
@@ -0,0 +1,133 @@
+import json
+import os
+import re
+
+import pytest
+
+from src.quest_rules import QuestRuleEngine
+
+QUESTS = ['meat_quest', 'map_quest', 'smuggler_quest']
+STATES = ['unknown', 'started', 'complete']
+
+TRADE_MEAT = {
+    'id': 'trade_meat',
+    'description': 'The player pays in meat.',
+    'requires': {'meat_quest': ['unknown', 'started']},
+    'sets': {'meat_quest': 'complete', 'map_quest': 'started'}
+}
+FIND_MAP = {
+    'id': 'find_map',
+    'description': 'The player finds the map.',
+    'requires': {'map_quest': 'started'},
+    'sets': {'map_quest': 'complete'}
+}
+TRADE_RUM = {
+    'id': 'trade_rum',
+    'description': 'The player pays in rum.',
+    'requires': {'smuggler_quest': ['unknown', 'started']},
+    'sets': {'smuggler_quest': 'complete'}
+}
+
+
+class FakeLoader:
+    def __init__(self, npcs):
+        self.npcs = npcs
+
+    def get_npc_background(self, character_id):
+        return self.npcs.get(character_id)
+
+
+@pytest.fixture
+def engine():
+    return QuestRuleEngine(FakeLoader({
+        'beaufort': {'quest_transitions': [TRADE_MEAT, FIND_MAP]},
+        'smuggler': {'quest_transitions': [TRADE_RUM]},
+        'bystander': {'quest_transitions': []},
+        'legacy': {'background': 'No table'},
+        'broken': {'quest_transitions': [{'id': 'bad', 'sets': {'gold_quest': 'complete'}}]}
+    }), QUESTS, STATES)
+
+
+def state(**overrides):
+    return {**{quest: 'unknown' for quest in QUESTS}, **overrides}
+
+
+def test_npcs_without_a_table_use_legacy_mode(engine):
+    assert engine.transitions_for('legacy') is None
+    assert engine.transitions_for('ghost') is None
+    assert engine.transitions_for('bystander') == []
+    assert engine.uses_rules(['beaufort', 'bystander'])
+    assert not engine.uses_rules(['beaufort', 'legacy'])
+
+
+def test_invalid_transitions_are_ignored(engine):
+    assert engine.transitions_for('broken') == []
+
+
+def test_available_checks_preconditions(engine):
+    assert [t['id'] for t in engine.available(['beaufort'], state())] == ['trade_meat']
+    assert [t['id'] for t in engine.available(['beaufort'], state(meat_quest='complete',
+                                                                  map_quest='started'))] == ['find_map']
+
+
+def test_apply_sets_states_in_order(engine):
+    new_state, applied, rejected = engine.apply(['beaufort'], ['trade_meat', 'find_map'], state())
+    assert applied == ['trade_meat', 'find_map']
+    assert rejected == []
+    assert new_state == state(meat_quest='complete', map_quest='complete')
+
+
+def test_apply_rejects_unmet_repeated_and_foreign_transitions(engine):
+    original = state(meat_quest='complete')
+    new_state, applied, rejected = engine.apply(
+        ['beaufort'], ['trade_meat', 'trade_rum', 'made_up'], original
+    )
+    assert applied == []
+    assert rejected == ['trade_meat', 'trade_rum', 'made_up']
+    assert new_state == original
+
+    _, applied, rejected = engine.apply(['beaufort'], ['trade_meat', 'trade_meat'], state())
+    assert applied == ['trade_meat']
+    assert rejected == ['trade_meat']
+
+
+def test_apply_does_not_mutate_the_request_state(engine):
+    original = state()
+    engine.apply(['smuggler'], ['trade_rum'], original)
+    assert original == state()
+
+
+def test_scene_applies_transitions_of_every_npc(engine):
+    new_state, applied, _ = engine.apply(['beaufort', 'smuggler'], ['trade_rum', 'trade_meat'], state())
+    assert applied == ['trade_rum', 'trade_meat']
+    assert new_state['smuggler_quest'] == 'complete'
+    assert new_state['meat_quest'] == 'complete'
+
+
+def test_parse_ids_reads_first_line_and_skips_none():
+    assert QuestRuleEngine.parse_ids(' trade_meat, find_map\nextra words') == ['trade_meat', 'find_map']
+    assert QuestRuleEngine.parse_ids('none') == []
+    assert QuestRuleEngine.parse_ids('') == []
+
+
+def test_describe_names_effects(engine):
+    text = QuestRuleEngine.describe(engine.transitions_for('smuggler'), with_speaker=True)
+    assert text == '- trade_rum (smuggler): The player pays in rum. Sets smuggler_quest to complete.'
+
+
+def test_shipped_thresholds_match_the_backgrounds():
+    data = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
+    with open(os.path.join(data, 'npc_backgrounds.json')) as f:
+        backgrounds = json.load(f)
+    with open(os.path.join(data, 'quest_transitions.json')) as f:
+        transitions = json.load(f)
+
+    checked = 0
+    for character_id, rules in transitions.items():
+        accepted = re.search(r'exceeding (\d+) units', backgrounds[character_id]['background'])
+        for rule in rules:
+            threshold = re.search(r'more than (\d+) units', rule['description'])
+            assert accepted and threshold, rule['id']
+            assert threshold.group(1) == accepted.group(1), rule['id']
+            checked += 1
+    assert checked == 4
@@ -0,0 +1,24 @@
+from src.world_digest import WorldDigest
+
+
+def extract(context, response):
+    return WorldDigest(table=None).extract_events('tavern_keeper', context, response)
+
+
+def test_small_talk_is_not_recorded():
+    events = extract(
+        {'player_message': 'hello', 'game_state': {'potato_quest': 'unknown'}},
+        {'game_state': {'potato_quest': 'unknown'}}
+    )
+    assert events == []
+
+
+def test_quest_change_records_transition_and_statement():
+    events = extract(
+        {'player_message': 'I  brought   the potatoes', 'game_state': {'potato_quest': 'started'}},
+        {'game_state': {'potato_quest': 'complete'}}
+    )
+    assert [(event['type'], event['text']) for event in events] == [
+        ('quest', 'potato_quest: started -> complete'),
+        ('told', 'I brought the potatoes')
+    ]
@@ -4,6 +4,8 @@
  * This stack creates all necessary AWS resources for the NPC dialogue system:
  * - DynamoDB tables for chat history and NPC data
  * - Lambda function for dialogue generation
+ * - SQS job queue and worker function for asynchronous dialogue generation
+ * - S3 history archive fed by the chat history stream and a daily sweep
  * - API Gateway for HTTP endpoints
  * - IAM roles and permissions
  * - CloudWatch logging
@@ -16,6 +18,11 @@ import * as lambda from 'aws-cdk-lib/aws-lambda';
 import * as apigateway from 'aws-cdk-lib/aws-apigateway';
 import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
 import * as iam from 'aws-cdk-lib/aws-iam';
+import * as sqs from 'aws-cdk-lib/aws-sqs';
+import * as s3 from 'aws-cdk-lib/aws-s3';
+import * as events from 'aws-cdk-lib/aws-events';
+import * as targets from 'aws-cdk-lib/aws-events-targets';
+import { DynamoEventSource, SqsEventSource } from 'aws-cdk-lib/aws-lambda-event-sources';
 import * as path from 'path';
 
 export class NPCDialogueStack extends cdk.Stack {
@@ -31,6 +38,7 @@ export class NPCDialogueStack extends cdk.Stack {
       billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
       timeToLiveAttribute: 'ttl',
       removalPolicy: cdk.RemovalPolicy.DESTROY, // For development only
+      stream: dynamodb.StreamViewType.OLD_IMAGE,  // Expired turns are archived from the stream
     });
     
     // Global Secondary Index for querying conversations by game_id
@@ -51,6 +59,43 @@ export class NPCDialogueStack extends cdk.Stack {
       stream: dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,  // If you want to track changes
     });
 
+    // Jobs Table: Tracks asynchronous dialogue jobs (?async=true)
+    // Workers claim jobs with conditional writes so redelivered messages never run twice
+    const jobsTable = new dynamodb.Table(this, 'DialogueJobsTable', {
+      partitionKey: { name: 'job_id', type: dynamodb.AttributeType.STRING },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: 'ttl',
+      removalPolicy: cdk.RemovalPolicy.DESTROY, // For development only
+    });
+
+    // Job Queue: Delivers job ids to the worker function
+    // Messages that keep failing end up in the dead-letter queue, where jobs are marked failed
+    const jobDeadLetterQueue = new sqs.Queue(this, 'DialogueJobDLQ', {
+      retentionPeriod: cdk.Duration.days(14),
+    });
+
+    const jobQueue = new sqs.Queue(this, 'DialogueJobQueue', {
+      visibilityTimeout: cdk.Duration.seconds(720),  // 6x the worker timeout
+      deadLetterQueue: {
+        queue: jobDeadLetterQueue,
+        maxReceiveCount: 3,  // Matches JOB_MAX_ATTEMPTS
+      },
+    });
+
+    // History Archive Bucket: Compressed JSONL history partitioned by game, character and date
+    const historyArchiveBucket = new s3.Bucket(this, 'HistoryArchiveBucket', {
+      encryption: s3.BucketEncryption.S3_MANAGED,
+      blockPublicAccess: s3.BlockPublicAccess.BLOCK_ALL,
+      lifecycleRules: [{
+        transitions: [{
+          storageClass: s3.StorageClass.INFREQUENT_ACCESS,
+          transitionAfter: cdk.Duration.days(30),
+        }],
+      }],
+      removalPolicy: cdk.RemovalPolicy.DESTROY, // For development only
+      autoDeleteObjects: true,
+    });
+
     // Add GSI for location-based queries if needed
     // npcDataTable.addGlobalSecondaryIndex({
     //   indexName: 'LocationIndex',
@@ -65,6 +110,16 @@ export class NPCDialogueStack extends cdk.Stack {
     //   projectionType: dynamodb.ProjectionType.ALL
     // });
 
+    // Profiling: off unless enabled with `cdk deploy -c profileSampleRate=0.01 -c profileToken=...`
+    const profileSampleRate = String(this.node.tryGetContext('profileSampleRate') ?? '0');
+    const profileToken = String(this.node.tryGetContext('profileToken') ?? '');
+
+    // Deadline shedding: optionally fall back to a faster model with `-c fastModelId=...`
+    const fastModelId = String(this.node.tryGetContext('fastModelId') ?? '');
+
+    // Async job callbacks: off unless hosts are allowed with `-c callbackAllowedHosts=a.com,b.com`
+    const callbackAllowedHosts = String(this.node.tryGetContext('callbackAllowedHosts') ?? '');
+
     // Lambda Layer: Contains all Python dependencies
     const lambdaLayer = new lambda.LayerVersion(this, 'NPCDialogueDependencies', {
       code: lambda.Code.fromAsset('lambda_layer.zip'),
@@ -84,40 +139,154 @@ export class NPCDialogueStack extends cdk.Stack {
         LOG_LEVEL: 'DEBUG',
         CHAT_HISTORY_TABLE: chatHistoryTable.tableName,
         NPC_DATA_TABLE: npcDataTable.tableName,
+        JOBS_TABLE: jobsTable.tableName,
+        JOB_QUEUE_URL: jobQueue.queueUrl,
+        JOB_MAX_ATTEMPTS: '3',
+        CALLBACK_ALLOWED_HOSTS: callbackAllowedHosts,
+        ARCHIVE_BUCKET: historyArchiveBucket.bucketName,
+        PROFILE_SAMPLE_RATE: profileSampleRate,
+        PROFILE_TOKEN: profileToken,
+        FAST_MODEL_ID: fastModelId,
+        COMPRESS_RESPONSES: 'false',  // API Gateway compresses
+      },
+    });
+
+    // Job Worker: Runs queued dialogue jobs outside the API Gateway time limit
+    const jobWorkerFunction = new lambda.Function(this, 'NPCDialogueJobWorker', {
+      runtime: lambda.Runtime.PYTHON_3_9,
+      handler: 'src.main.job_worker_handler',
+      code: lambda.Code.fromAsset('lambda'),
+      timeout: cdk.Duration.seconds(120),
+      memorySize: 256,
+      layers: [lambdaLayer],
+      environment: {
+        POWERTOOLS_SERVICE_NAME: 'NPCDialogueWorker',
+        LOG_LEVEL: 'DEBUG',
+        CHAT_HISTORY_TABLE: chatHistoryTable.tableName,
+        NPC_DATA_TABLE: npcDataTable.tableName,
+        JOBS_TABLE: jobsTable.tableName,
+        JOB_QUEUE_URL: jobQueue.queueUrl,
+        JOB_MAX_ATTEMPTS: '3',
+        CALLBACK_ALLOWED_HOSTS: callbackAllowedHosts,
+        ARCHIVE_BUCKET: historyArchiveBucket.bucketName,
+        PROFILE_SAMPLE_RATE: profileSampleRate,
+        PROFILE_TOKEN: profileToken,
+      },
+    });
+
+    jobWorkerFunction.addEventSource(new SqsEventSource(jobQueue, {
+      batchSize: 5,
+      reportBatchItemFailures: true,  // Only failed jobs are redelivered
+    }));
+
+    // Job Dead-Letter Handler: Marks jobs that ran out of attempts as failed
+    const jobDeadLetterFunction = new lambda.Function(this, 'NPCDialogueJobDeadLetter', {
+      runtime: lambda.Runtime.PYTHON_3_9,
+      handler: 'src.main.job_dead_letter_handler',
+      code: lambda.Code.fromAsset('lambda'),
+      timeout: cdk.Duration.seconds(30),
+      memorySize: 256,
+      layers: [lambdaLayer],
+      environment: {
+        POWERTOOLS_SERVICE_NAME: 'NPCDialogueJobDeadLetter',
+        LOG_LEVEL: 'INFO',
+        CHAT_HISTORY_TABLE: chatHistoryTable.tableName,
+        NPC_DATA_TABLE: npcDataTable.tableName,
+        JOBS_TABLE: jobsTable.tableName,
+        JOB_QUEUE_URL: jobQueue.queueUrl,
+        JOB_MAX_ATTEMPTS: '3',
+        CALLBACK_ALLOWED_HOSTS: callbackAllowedHosts,
       },
     });
 
+    jobDeadLetterFunction.addEventSource(new SqsEventSource(jobDeadLetterQueue, {
+      batchSize: 10,
+      reportBatchItemFailures: true,  // Jobs still leased are retried
+    }));
+
+    // History Archiver: Moves old turns from the chat history table to S3
+    const historyArchiveFunction = new lambda.Function(this, 'NPCHistoryArchiver', {
+      runtime: lambda.Runtime.PYTHON_3_9,
+      handler: 'src.history_archive.lambda_handler',
+      code: lambda.Code.fromAsset('lambda'),
+      timeout: cdk.Duration.minutes(5),
+      memorySize: 256,
+      layers: [lambdaLayer],
+      environment: {
+        POWERTOOLS_SERVICE_NAME: 'NPCHistoryArchiver',
+        LOG_LEVEL: 'INFO',
+        CHAT_HISTORY_TABLE: chatHistoryTable.tableName,
+        ARCHIVE_BUCKET: historyArchiveBucket.bucketName,
+        ARCHIVE_AFTER_DAYS: '7',   // Well before the 30 day TTL
+        ARCHIVE_KEEP_RECENT: '5',  // Latest turns stay hot for prompts
+      },
+    });
+
+    // TTL expiries arrive on the stream; only removals are delivered
+    historyArchiveFunction.addEventSource(new DynamoEventSource(chatHistoryTable, {
+      startingPosition: lambda.StartingPosition.TRIM_HORIZON,
+      batchSize: 100,
+      retryAttempts: 5,
+      filters: [lambda.FilterCriteria.filter({ eventName: lambda.FilterRule.isEqual('REMOVE') })],
+    }));
+
+    // Daily sweep of turns older than ARCHIVE_AFTER_DAYS
+    new events.Rule(this, 'HistoryArchiveSweep', {
+      schedule: events.Schedule.rate(cdk.Duration.days(1)),
+      targets: [new targets.LambdaFunction(historyArchiveFunction)],
+    });
+
     // IAM Permissions Setup
     // Grant DynamoDB access
     chatHistoryTable.grantReadWriteData(dialogueFunction);  // Full access to chat history
     npcDataTable.grantReadData(dialogueFunction);  // Read-only for NPC data
+    jobsTable.grantReadWriteData(dialogueFunction);
+    jobQueue.grantSendMessages(dialogueFunction);
+
+    chatHistoryTable.grantReadWriteData(jobWorkerFunction);
+    npcDataTable.grantReadData(jobWorkerFunction);
+    jobsTable.grantReadWriteData(jobWorkerFunction);
+    jobsTable.grantReadWriteData(jobDeadLetterFunction);
+
+    historyArchiveBucket.grantRead(dialogueFunction);
+    historyArchiveBucket.grantRead(jobWorkerFunction);
+    historyArchiveBucket.grantReadWrite(historyArchiveFunction);
+    chatHistoryTable.grantReadWriteData(historyArchiveFunction);
     
-    // Grant Amazon Bedrock permissions for LLM access
-    dialogueFunction.addToRolePolicy(new iam.PolicyStatement({
-      effect: iam.Effect.ALLOW,
-      actions: [
-        'bedrock:InvokeModel',
-        'bedrock:ListFoundationModels',
-      ],
-      resources: ['*'],  // TODO: Restrict to specific model ARNs in production
-    }));
+    for (const fn of [dialogueFunction, jobWorkerFunction]) {
+      // Grant Amazon Bedrock permissions for LLM access
+      fn.addToRolePolicy(new iam.PolicyStatement({
+        effect: iam.Effect.ALLOW,
+        actions: [
+          'bedrock:InvokeModel',
+          'bedrock:ListFoundationModels',
+        ],
+        resources: ['*'],  // TODO: Restrict to specific model ARNs in production
+      }));
 
-    // Setup CloudWatch logging permissions
-    dialogueFunction.addToRolePolicy(new iam.PolicyStatement({
-      effect: iam.Effect.ALLOW,
-      actions: [
-        'logs:CreateLogGroup',
-        'logs:CreateLogStream',
-        'logs:PutLogEvents',
-      ],
-      resources: ['*'],
-    }));
+      // Setup CloudWatch logging permissions
+      fn.addToRolePolicy(new iam.PolicyStatement({
+        effect: iam.Effect.ALLOW,
+        actions: [
+          'logs:CreateLogGroup',
+          'logs:CreateLogStream',
+          'logs:PutLogEvents',
+        ],
+        resources: ['*'],
+      }));
+    }
 
     // API Gateway Configuration
     // Creates REST API with CORS support
     const api = new apigateway.RestApi(this, 'NPCDialogueApi', {
       restApiName: 'NPC Dialogue Service',
       description: 'API for generating NPC dialogue using AWS Bedrock',
+      // MessagePack responses are returned base64 encoded by the Lambda; API Gateway
+      // only turns them back into binary when the client accepts one of these types.
+      // Everything else (JSON bodies, CORS preflight) stays text.
+      binaryMediaTypes: ['application/msgpack', 'application/x-msgpack'],
+      // Accept-Encoding is honoured by API Gateway itself (gzip, deflate)
+      minimumCompressionSize: 1024,
       defaultCorsPreflightOptions: {
         allowOrigins: apigateway.Cors.ALL_ORIGINS,
         allowMethods: apigateway.Cors.ALL_METHODS,
@@ -127,6 +296,10 @@ export class NPCDialogueStack extends cdk.Stack {
           'Authorization',
           'X-Api-Key',
           'X-Amz-Security-Token',
+          'Idempotency-Key',
+          'X-Response-Format',
+          'X-Profile',
+          'X-Request-Deadline-Ms',
         ],
       },
     });
@@ -140,6 +313,18 @@ export class NPCDialogueStack extends cdk.Stack {
       apiKeyRequired: true,
     });
 
+    // POST /generate-scene - One response voicing several NPCs at once
+    const sceneResource = api.root.addResource('generate-scene');
+    sceneResource.addMethod('POST', dialogueIntegration, {
+      apiKeyRequired: true,
+    });
+
+    // POST /prefetch - Warm NPC conversations before the player speaks
+    const prefetchResource = api.root.addResource('prefetch');
+    prefetchResource.addMethod('POST', dialogueIntegration, {
+      apiKeyRequired: true,
+    });
+
     // GET /chat-history/{character_id} - Retrieve conversation history
     const historyResource = api.root.addResource('chat-history')
       .addResource('{character_id}');
@@ -147,6 +332,13 @@ export class NPCDialogueStack extends cdk.Stack {
       apiKeyRequired: true,
     });
 
+    // GET /jobs/{job_id} - Poll an asynchronous dialogue job
+    const jobResource = api.root.addResource('jobs')
+      .addResource('{job_id}');
+    jobResource.addMethod('GET', dialogueIntegration, {
+      apiKeyRequired: true,
+    });
+
     // API Security Configuration
     // Setup API key and usage plan for rate limiting
     const apiKey = api.addApiKey('NPCDialogueApiKey');
@@ -185,6 +377,16 @@ export class NPCDialogueStack extends cdk.Stack {
       description: 'DynamoDB Chat History Table Name',
     });
 
+    new cdk.CfnOutput(this, 'JobQueueUrl', {
+      value: jobQueue.queueUrl,
+      description: 'SQS Dialogue Job Queue URL',
+    });
+
+    new cdk.CfnOutput(this, 'HistoryArchiveBucketName', {
+      value: historyArchiveBucket.bucketName,
+      description: 'S3 History Archive Bucket Name',
+    });
+
     new cdk.CfnOutput(this, 'NPCDataTableName', {
       value: npcDataTable.tableName,
       description: 'DynamoDB NPC Data Table Name',
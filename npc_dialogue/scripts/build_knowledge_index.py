@@ -0,0 +1,44 @@
+"""
+Knowledge Index Build Script
+Chunks NPC data from data/npc_backgrounds.json and writes the BM25 index
+that is shipped with the Lambda code
+"""
+
+import json
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')))
+from src.knowledge_index import build_index, DEFAULT_INDEX_PATH  # noqa: E402
+
+
+def load_npc_backgrounds(path: str) -> dict:
+    """
+    Load NPC background data from JSON file
+    """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Error: {path} not found")
+        raise
+    except json.JSONDecodeError:
+        print(f"Error: Invalid JSON format in {path}")
+        raise
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the NPC knowledge index')
+    parser.add_argument('--input', default='data/npc_backgrounds.json', help='NPC backgrounds file')
+    parser.add_argument('--output', default=DEFAULT_INDEX_PATH, help='Index file to write')
+
+    args = parser.parse_args()
+
+    index = build_index(load_npc_backgrounds(args.input))
+    with open(args.output, 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+
+    chunk_count = sum(len(chunks) for chunks in index['npcs'].values())
+    print(f"Indexed {chunk_count} chunks for {len(index['npcs'])} NPCs")
+    print(f"Index written to: {args.output} ({os.path.getsize(args.output)} bytes)")
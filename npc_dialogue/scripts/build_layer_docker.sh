@@ -28,7 +28,9 @@ RUN mkdir -p /opt/python && \
     aws-xray-sdk==2.12.1 \
     boto3==1.28.0 \
     python-json-logger==2.0.7 \
-    typing-extensions>=4.5.0
+    typing-extensions>=4.5.0 \
+    msgpack==1.0.7 \
+    Brotli==1.1.0
 
 # Verify pydantic installation
 RUN ls -la /opt/python/pydantic*
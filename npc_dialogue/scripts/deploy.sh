@@ -3,6 +3,9 @@
 # Exit on error
 set -e
 
+echo "Building NPC knowledge index..."
+python scripts/build_knowledge_index.py
+
 echo "Building Lambda layer..."
 ./scripts/build_layer_docker.sh
 
@@ -0,0 +1,609 @@
+"""
+Analytics Export Script
+Streams the chat history table into columnar batches and computes quest funnels,
+per-NPC turn counts and token/latency distributions with NumPy
+
+Turns are read with paginated GameIdIndex queries (--game-id) or with a
+parallel segmented scan of the whole table (--segments). The daily archive
+sweep moves older turns out of the table, so turns are also read from the
+history archive (--archive-bucket, or --archive-root for a local archive).
+Without either, only turns still in the table are counted. Every --batch-size
+turns are converted into NumPy columns, folded into fixed-size accumulators
+(histograms, counters, per-game funnel arrays) and dropped. Memory therefore
+grows with the number of games and NPCs, not with the number of turns.
+
+Percentiles are read off the histograms, so they are exact to the bin width
+(bins are log-spaced, about 5% wide).
+
+Results are written to --output-dir:
+- analytics_<timestamp>.npz: raw accumulators (np.load to explore further)
+- analytics_<timestamp>.json: summary of funnels, NPCs and distributions
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import boto3
+import numpy as np
+from boto3.dynamodb.conditions import Key
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')))
+from src.history_archive import HistoryArchive, LocalArchiveStorage, S3ArchiveStorage  # noqa: E402
+
+# Quest states in funnel order; anything else is ignored
+QUEST_STATES = ['unknown', 'started', 'complete']
+STATE_CODES = {state: code for code, state in enumerate(QUEST_STATES)}
+
+# Log-spaced bin edges; the last bin catches everything above the range
+LATENCY_BINS = np.concatenate([[0], np.geomspace(10, 60000, 180), [np.inf]])
+TOKEN_BINS = np.concatenate([[0], np.geomspace(1, 20000, 200), [np.inf]])
+CHAR_BINS = np.concatenate([[0], np.geomspace(1, 20000, 200), [np.inf]])
+
+# Aliased throughout, since several of these are DynamoDB reserved words
+PROJECTION = ('composite_key, game_id, character_id, #ts, #ctx.game_state, '
+              '#resp.game_state, #resp.dialogue, #metrics')
+PROJECTION_NAMES = {'#ts': 'timestamp', '#ctx': 'context', '#resp': 'response', '#metrics': 'metrics'}
+
+METRIC_COLUMNS = ['latency_ms', 'model_latency_ms', 'input_tokens', 'output_tokens']
+
+
+class Vocabulary:
+    """Dictionary encoding of strings (game ids, NPC ids, quest names) to dense ints"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def encode(self, name: str) -> int:
+        code = self.index.get(name)
+        if code is None:
+            code = self.index[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def _grow(array: np.ndarray, size: int, axis: int = 0) -> np.ndarray:
+    """Zero-pad an accumulator along an axis to at least `size` entries"""
+    missing = size - array.shape[axis]
+    if missing <= 0:
+        return array
+    padding = [(0, 0)] * array.ndim
+    padding[axis] = (0, max(missing, array.shape[axis] // 2))  # Amortized growth
+    return np.pad(array, padding)
+
+
+def _state_code(state) -> int:
+    return STATE_CODES.get(str(state).lower(), -1) if state is not None else -1
+
+
+class Batch:
+    """Columnar buffer of up to `size` turns"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        self.game: List[int] = []
+        self.npc: List[int] = []
+        self.chars: List[int] = []
+        self.scene_size: List[int] = []
+        self.speculative: List[bool] = []
+        self.metrics: Dict[str, List[float]] = {column: [] for column in METRIC_COLUMNS}
+        # One entry per (turn, quest) pair that appears in the turn's game state
+        self.t_row: List[int] = []
+        self.t_quest: List[int] = []
+        self.t_old: List[int] = []
+        self.t_new: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.game)
+
+    def full(self) -> bool:
+        return len(self.game) >= self.size
+
+
+class HistoryAnalytics:
+    """Accumulates analytics over batches of chat history turns"""
+
+    def __init__(self, batch_size: int = 50000):
+        self.games = Vocabulary()
+        self.npcs = Vocabulary()
+        self.quests = Vocabulary()
+        self.batch = Batch(batch_size)
+        self.turns = 0
+        self.skipped = 0
+        self.first_timestamp: Optional[str] = None
+        self.last_timestamp: Optional[str] = None
+
+        states = len(QUEST_STATES)
+        self.npc_turns = np.zeros(0, dtype=np.int64)
+        self.npc_latency_sum = np.zeros(0, dtype=np.float64)
+        self.npc_latency_count = np.zeros(0, dtype=np.int64)
+        self.game_turns = np.zeros(0, dtype=np.int64)
+        # [quest, old state, new state]
+        self.transitions = np.zeros((0, states, states), dtype=np.int64)
+        # [npc, quest, new state] for turns that moved a quest forward
+        self.npc_advances = np.zeros((0, 0, states), dtype=np.int64)
+        # [game, quest] furthest state reached and turns spent while started
+        self.game_max_state = np.zeros((0, 0), dtype=np.int8)
+        self.game_started_turns = np.zeros((0, 0), dtype=np.int32)
+
+        self.histograms = {
+            'latency_ms': np.zeros(len(LATENCY_BINS) - 1, dtype=np.int64),
+            'model_latency_ms': np.zeros(len(LATENCY_BINS) - 1, dtype=np.int64),
+            'input_tokens': np.zeros(len(TOKEN_BINS) - 1, dtype=np.int64),
+            'output_tokens': np.zeros(len(TOKEN_BINS) - 1, dtype=np.int64),
+            'response_chars': np.zeros(len(CHAR_BINS) - 1, dtype=np.int64)
+        }
+        self.bins = {
+            'latency_ms': LATENCY_BINS,
+            'model_latency_ms': LATENCY_BINS,
+            'input_tokens': TOKEN_BINS,
+            'output_tokens': TOKEN_BINS,
+            'response_chars': CHAR_BINS
+        }
+        # Response size against latency: joint histogram and moments for Pearson's r
+        self.tokens_vs_latency = np.zeros((len(TOKEN_BINS) - 1, len(LATENCY_BINS) - 1), dtype=np.int64)
+        self.moments = np.zeros(6, dtype=np.float64)  # n, sx, sy, sxx, syy, sxy
+        self.speculative_turns = 0
+
+    def add(self, item: Dict):
+        """Buffer one history item, folding the batch once it is full"""
+        game_id = item.get('game_id')
+        character_id = item.get('character_id')
+        if not game_id or not character_id or item.get('composite_key') != f"{game_id}#{character_id}":
+            self.skipped += 1  # Digest, head, prefetch and idempotency records
+            return
+
+        batch = self.batch
+        row = len(batch)
+        batch.game.append(self.games.encode(game_id))
+        batch.npc.append(self.npcs.encode(character_id))
+
+        response = item.get('response') or {}
+        dialogue = response.get('dialogue', '') if isinstance(response, dict) else str(response)
+        batch.chars.append(len(dialogue or ''))
+
+        metrics = item.get('metrics') or {}
+        for column in METRIC_COLUMNS:
+            value = metrics.get(column)
+            batch.metrics[column].append(float(value) if value is not None else np.nan)
+        batch.scene_size.append(int(metrics.get('scene_size', 1)))
+        batch.speculative.append(bool(metrics.get('speculative', False)))
+
+        old_state = (item.get('context') or {}).get('game_state') or {}
+        new_state = (response.get('game_state') or {}) if isinstance(response, dict) else {}
+        if isinstance(old_state, dict) and isinstance(new_state, dict):
+            for quest in set(old_state) | set(new_state):
+                old_code = _state_code(old_state.get(quest, 'unknown'))
+                new_code = _state_code(new_state.get(quest, old_state.get(quest, 'unknown')))
+                if old_code < 0 or new_code < 0:
+                    continue
+                batch.t_row.append(row)
+                batch.t_quest.append(self.quests.encode(quest))
+                batch.t_old.append(old_code)
+                batch.t_new.append(new_code)
+
+        timestamp = item.get('timestamp')
+        if timestamp:
+            if self.first_timestamp is None or timestamp < self.first_timestamp:
+                self.first_timestamp = timestamp
+            if self.last_timestamp is None or timestamp > self.last_timestamp:
+                self.last_timestamp = timestamp
+
+        if batch.full():
+            self.flush()
+
+    def _resize(self):
+        games, npcs, quests = len(self.games), len(self.npcs), len(self.quests)
+        self.npc_turns = _grow(self.npc_turns, npcs)
+        self.npc_latency_sum = _grow(self.npc_latency_sum, npcs)
+        self.npc_latency_count = _grow(self.npc_latency_count, npcs)
+        self.game_turns = _grow(self.game_turns, games)
+        self.transitions = _grow(self.transitions, quests)
+        self.npc_advances = _grow(_grow(self.npc_advances, npcs, 0), quests, 1)
+        self.game_max_state = _grow(_grow(self.game_max_state, games, 0), quests, 1)
+        self.game_started_turns = _grow(_grow(self.game_started_turns, games, 0), quests, 1)
+
+    def flush(self):
+        """Fold the buffered batch into the accumulators with vectorized operations"""
+        batch = self.batch
+        if not len(batch):
+            return
+        self._resize()
+
+        game = np.asarray(batch.game, dtype=np.int64)
+        npc = np.asarray(batch.npc, dtype=np.int64)
+        self.turns += len(game)
+        self.npc_turns += np.bincount(npc, minlength=self.npc_turns.size)
+        self.game_turns += np.bincount(game, minlength=self.game_turns.size)
+
+        columns = {column: np.asarray(values, dtype=np.float64) for column, values in batch.metrics.items()}
+        scene_size = np.maximum(np.asarray(batch.scene_size, dtype=np.float64), 1)
+        # A scene's tokens are shared by the NPCs that spoke in it
+        columns['input_tokens'] /= scene_size
+        columns['output_tokens'] /= scene_size
+        columns['response_chars'] = np.asarray(batch.chars, dtype=np.float64)
+        self.speculative_turns += int(np.count_nonzero(batch.speculative))
+
+        for column, values in columns.items():
+            values = values[~np.isnan(values)]
+            self.histograms[column] += np.histogram(values, bins=self.bins[column])[0]
+
+        latency = columns['latency_ms']
+        timed = ~np.isnan(latency)
+        self.npc_latency_sum += np.bincount(npc[timed], weights=latency[timed],
+                                            minlength=self.npc_latency_sum.size)
+        self.npc_latency_count += np.bincount(npc[timed], minlength=self.npc_latency_count.size)
+
+        tokens = columns['output_tokens']
+        paired = timed & ~np.isnan(tokens)
+        x, y = tokens[paired], latency[paired]
+        self.tokens_vs_latency += np.histogram2d(x, y, bins=[TOKEN_BINS, LATENCY_BINS])[0].astype(np.int64)
+        self.moments += [x.size, x.sum(), y.sum(), (x * x).sum(), (y * y).sum(), (x * y).sum()]
+
+        if batch.t_row:
+            rows = np.asarray(batch.t_row, dtype=np.int64)
+            quest = np.asarray(batch.t_quest, dtype=np.int64)
+            old = np.asarray(batch.t_old, dtype=np.int64)
+            new = np.asarray(batch.t_new, dtype=np.int64)
+            states = len(QUEST_STATES)
+
+            self.transitions += np.bincount(
+                (quest * states + old) * states + new,
+                minlength=self.transitions.size
+            ).reshape(self.transitions.shape)
+
+            forward = new > old
+            npc_shape = self.npc_advances.shape
+            self.npc_advances += np.bincount(
+                (npc[rows[forward]] * npc_shape[1] + quest[forward]) * states + new[forward],
+                minlength=self.npc_advances.size
+            ).reshape(npc_shape)
+
+            turn_game = game[rows]
+            np.maximum.at(self.game_max_state, (turn_game, quest), np.maximum(old, new).astype(np.int8))
+            started = old == STATE_CODES['started']
+            np.add.at(self.game_started_turns, (turn_game[started], quest[started]), 1)
+
+        batch.clear()
+
+    def summary(self) -> Dict:
+        """Funnels, per-NPC figures and distribution percentiles"""
+        self.flush()
+        self._resize()
+        games, npcs, quests = len(self.games), len(self.npcs), len(self.quests)
+        started_code, complete_code = STATE_CODES['started'], STATE_CODES['complete']
+
+        funnels = {}
+        for q, quest in enumerate(self.quests.names):
+            reached = self.game_max_state[:games, q]
+            started_turns = self.game_started_turns[:games, q]
+            completed = reached == complete_code
+            stuck = reached == started_code
+            funnels[quest] = {
+                'games': games,
+                'started': int(np.count_nonzero(reached >= started_code)),
+                'completed': int(np.count_nonzero(completed)),
+                'stuck': int(np.count_nonzero(stuck)),
+                'completion_rate': round(float(completed.sum() / max((reached >= started_code).sum(), 1)), 4),
+                'median_turns_to_complete': _median(started_turns[completed]),
+                'median_turns_while_stuck': _median(started_turns[stuck]),
+                'transitions': {
+                    f"{QUEST_STATES[old]}->{QUEST_STATES[new]}": int(self.transitions[q, old, new])
+                    for old in range(len(QUEST_STATES)) for new in range(len(QUEST_STATES))
+                    if old != new and self.transitions[q, old, new]
+                }
+            }
+
+        mean_latency = np.divide(self.npc_latency_sum[:npcs], self.npc_latency_count[:npcs],
+                                 out=np.full(npcs, np.nan), where=self.npc_latency_count[:npcs] > 0)
+        npc_summary = {}
+        for n in np.argsort(-self.npc_turns[:npcs], kind='stable'):
+            npc_summary[self.npcs.names[n]] = {
+                'turns': int(self.npc_turns[n]),
+                'mean_latency_ms': None if np.isnan(mean_latency[n]) else round(float(mean_latency[n]), 1),
+                'quests_started': {
+                    self.quests.names[q]: int(self.npc_advances[n, q, started_code])
+                    for q in range(quests) if self.npc_advances[n, q, started_code]
+                },
+                'quests_completed': {
+                    self.quests.names[q]: int(self.npc_advances[n, q, complete_code])
+                    for q in range(quests) if self.npc_advances[n, q, complete_code]
+                }
+            }
+
+        distributions = {
+            column: _distribution(counts, self.bins[column])
+            for column, counts in self.histograms.items()
+        }
+
+        return {
+            'turns': self.turns,
+            'games': games,
+            'npcs': npcs,
+            'skipped_records': self.skipped,
+            'speculative_turns': self.speculative_turns,
+            'first_timestamp': self.first_timestamp,
+            'last_timestamp': self.last_timestamp,
+            'quest_funnels': funnels,
+            'npc': npc_summary,
+            'distributions': distributions,
+            'output_tokens_latency_correlation': _pearson(self.moments)
+        }
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Accumulators for the .npz export, trimmed to the observed sizes"""
+        self.flush()
+        self._resize()
+        games, npcs, quests = len(self.games), len(self.npcs), len(self.quests)
+        arrays = {
+            'game_ids': np.array(self.games.names),
+            'npc_ids': np.array(self.npcs.names),
+            'quests': np.array(self.quests.names),
+            'quest_states': np.array(QUEST_STATES),
+            'npc_turns': self.npc_turns[:npcs],
+            'npc_latency_sum_ms': self.npc_latency_sum[:npcs],
+            'npc_latency_count': self.npc_latency_count[:npcs],
+            'game_turns': self.game_turns[:games],
+            'transitions': self.transitions[:quests],
+            'npc_advances': self.npc_advances[:npcs, :quests],
+            'game_max_state': self.game_max_state[:games, :quests],
+            'game_started_turns': self.game_started_turns[:games, :quests],
+            'output_tokens_vs_latency': self.tokens_vs_latency,
+            'latency_bins': LATENCY_BINS,
+            'token_bins': TOKEN_BINS,
+            'char_bins': CHAR_BINS
+        }
+        for column, counts in self.histograms.items():
+            arrays[f"{column}_histogram"] = counts
+        return arrays
+
+
+def _median(values: np.ndarray) -> Optional[float]:
+    return float(np.median(values)) if values.size else None
+
+
+def _distribution(counts: np.ndarray, edges: np.ndarray) -> Dict:
+    """Count and percentiles of a histogram, interpolated within bins"""
+    total = int(counts.sum())
+    result: Dict = {'count': total}
+    if not total:
+        return result
+    cumulative = np.cumsum(counts)
+    for p in (50, 90, 95, 99):
+        rank = total * p / 100
+        b = int(np.searchsorted(cumulative, rank))
+        below = cumulative[b - 1] if b else 0
+        low, high = edges[b], edges[b + 1]
+        if np.isinf(high):
+            value = low
+        else:
+            value = low + (high - low) * (rank - below) / max(counts[b], 1)
+        result[f"p{p}"] = round(float(value), 1)
+    return result
+
+
+def _pearson(moments: np.ndarray) -> Optional[float]:
+    n, sx, sy, sxx, syy, sxy = moments
+    if n < 2:
+        return None
+    covariance = n * sxy - sx * sy
+    variance = (n * sxx - sx * sx) * (n * syy - sy * sy)
+    return round(float(covariance / np.sqrt(variance)), 4) if variance > 0 else None
+
+
+def _paginate(fetch, kwargs: Dict) -> Iterator[List[Dict]]:
+    while True:
+        response = fetch(**kwargs)
+        yield response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _time_condition(since: Optional[str], until: Optional[str]):
+    if since and until:
+        return Key('timestamp').between(since, until)
+    if since:
+        return Key('timestamp').gte(since)
+    if until:
+        return Key('timestamp').lte(until)
+    return None
+
+
+def query_games(table, game_ids: List[str], since: Optional[str], until: Optional[str]) -> Iterator[List[Dict]]:
+    """Pages of a game's turns from the GameIdIndex"""
+    for game_id in game_ids:
+        condition = Key('game_id').eq(game_id)
+        time_condition = _time_condition(since, until)
+        if time_condition is not None:
+            condition = condition & time_condition
+        yield from _paginate(table.query, {
+            'IndexName': 'GameIdIndex',
+            'KeyConditionExpression': condition,
+            'ProjectionExpression': PROJECTION,
+            'ExpressionAttributeNames': PROJECTION_NAMES
+        })
+
+
+def scan_segment(table, segment: int, total_segments: int, since: Optional[str],
+                 until: Optional[str]) -> Iterator[List[Dict]]:
+    """Pages of one segment of a parallel scan, conversation turns only"""
+    condition = 'attribute_exists(character_id)'
+    values = {}
+    if since:
+        condition += ' AND #ts >= :since'
+        values[':since'] = since
+    if until:
+        condition += ' AND #ts <= :until'
+        values[':until'] = until
+    kwargs = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'FilterExpression': condition,
+        'ProjectionExpression': PROJECTION,
+        'ExpressionAttributeNames': PROJECTION_NAMES
+    }
+    if values:
+        kwargs['ExpressionAttributeValues'] = values
+    yield from _paginate(table.scan, kwargs)
+
+
+def stream_pages(table_name: str, profile: Optional[str], region: str, workers: int,
+                 game_ids: Optional[List[str]], since: Optional[str],
+                 until: Optional[str]) -> Iterator[List[Dict]]:
+    """
+    Read pages from several threads and hand them over in arrival order
+
+    The hand-over queue is bounded, so readers pause while the aggregator
+    catches up instead of piling pages up in memory. When a reader fails (or the
+    caller stops early) the other readers are told to stop, so none is left
+    blocked on a full queue.
+    """
+    pages: queue.Queue = queue.Queue(maxsize=workers * 2)
+    done = object()
+    stop = threading.Event()
+
+    def hand_over(item) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader(task: int):
+        try:
+            # boto3 resources are not thread-safe; one session per reader
+            session = boto3.Session(profile_name=profile, region_name=region)
+            table = session.resource('dynamodb').Table(table_name)
+            if game_ids is not None:
+                source = query_games(table, game_ids[task::workers], since, until)
+            else:
+                source = scan_segment(table, task, workers, since, until)
+            for page in source:
+                if not hand_over(page):
+                    return
+        except Exception as e:
+            hand_over(e)
+        finally:
+            hand_over(done)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for task in range(workers):
+            pool.submit(reader, task)
+        try:
+            finished = 0
+            while finished < workers:
+                page = pages.get()
+                if page is done:
+                    finished += 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield page
+        finally:
+            stop.set()
+
+
+def archive_pages(args) -> Iterator[List[Dict]]:
+    """Pages of archived turns matching the export filters, one page per part"""
+    if args.archive_bucket:
+        session = boto3.Session(profile_name=args.profile, region_name=args.region)
+        storage = S3ArchiveStorage(args.archive_bucket, s3=session.client('s3'))
+    else:
+        storage = LocalArchiveStorage(args.archive_root)
+    archive = HistoryArchive(storage)
+    for game_id in args.game_id or [None]:
+        yield from archive.scan(game_id, args.since, args.until)
+
+
+def export(args) -> Dict:
+    analytics = HistoryAnalytics(batch_size=args.batch_size)
+    workers = args.segments
+    if args.game_id:
+        workers = max(1, min(args.segments, len(args.game_id)))
+
+    pages = 0
+    for page in stream_pages(args.table_name, args.profile, args.region, workers,
+                             args.game_id, args.since, args.until):
+        for item in page:
+            analytics.add(item)
+        pages += 1
+        if pages % 100 == 0:
+            print(f"Read {pages} pages, {analytics.turns + len(analytics.batch)} turns")
+
+    if args.archive_bucket or args.archive_root:
+        archived = 0
+        for page in archive_pages(args):
+            for item in page:
+                analytics.add(item)
+            archived += len(page)
+        print(f"Read {archived} archived turns")
+    else:
+        print("Warning: no --archive-bucket or --archive-root given; turns already moved to the "
+              "history archive are not counted")
+
+    summary = analytics.summary()
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    arrays_path = os.path.join(args.output_dir, f"analytics_{stamp}.npz")
+    summary_path = os.path.join(args.output_dir, f"analytics_{stamp}.json")
+    np.savez_compressed(arrays_path, **analytics.arrays())
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    summary['files'] = [summary_path, arrays_path]
+    return summary
+
+
+def print_summary(summary: Dict):
+    print(f"\nTurns: {summary['turns']} across {summary['games']} games and {summary['npcs']} NPCs")
+    print("\nQuest funnels (games started -> completed, stuck):")
+    for quest, funnel in summary['quest_funnels'].items():
+        print(f"  {quest:<20} {funnel['started']:>7} -> {funnel['completed']:<7} stuck {funnel['stuck']}")
+    print("\nBusiest NPCs:")
+    for character_id, npc in list(summary['npc'].items())[:10]:
+        print(f"  {character_id:<24} {npc['turns']:>8} turns  mean latency {npc['mean_latency_ms']} ms")
+    latency = summary['distributions']['latency_ms']
+    if latency['count']:
+        print(f"\nLatency ms: p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}")
+    print(f"Output tokens / latency correlation: {summary['output_tokens_latency_correlation']}")
+    for path in summary.get('files', []):
+        print(f"Written: {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Export chat history analytics',
+        epilog='Turns the archive sweep moved out of the table are only counted when the archive '
+               'is given with --archive-bucket or --archive-root.'
+    )
+    parser.add_argument('table_name', help='Name of the chat history DynamoDB table')
+    parser.add_argument('--game-id', action='append',
+                        help='Only read these games through the GameIdIndex (repeatable); default scans the table')
+    parser.add_argument('--since', help='Only turns at or after this ISO timestamp')
+    parser.add_argument('--until', help='Only turns at or before this ISO timestamp')
+    parser.add_argument('--segments', type=int, default=4, help='Parallel scan segments / query threads')
+    parser.add_argument('--archive-bucket', help='S3 bucket of the history archive, read alongside the table')
+    parser.add_argument('--archive-root', help='Local history archive directory, read alongside the table')
+    parser.add_argument('--batch-size', type=int, default=50000, help='Turns per columnar batch')
+    parser.add_argument('--output-dir', default='analytics', help='Directory for result files')
+    parser.add_argument('--profile', default='personal', help='AWS profile name')
+    parser.add_argument('--region', default='us-east-1', help='AWS region name')
+
+    args = parser.parse_args()
+    print_summary(export(args))
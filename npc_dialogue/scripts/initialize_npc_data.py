@@ -23,6 +23,19 @@ def load_npc_backgrounds() -> Dict:
         print("Error: Invalid JSON format in npc_backgrounds.json")
         raise
 
+def load_quest_transitions(path: str = 'data/quest_transitions.json') -> Dict:
+    """
+    Load each NPC's quest transition table
+
+    NPCs missing from the file keep returning the full game state from the model.
+    """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Warning: {path} not found, NPCs will return full game states")
+        return {}
+
 def initialize_npc_table(table_name: str, profile_name: str = 'default', region: str = 'us-east-1'):
     """
     Initialize DynamoDB table with NPC data
@@ -32,8 +45,9 @@ def initialize_npc_table(table_name: str, profile_name: str = 'default', region:
     dynamodb = session.resource('dynamodb')
     table = dynamodb.Table(table_name)
     
-    # Load NPC background data
+    # Load NPC background data and quest transition tables
     npc_data = load_npc_backgrounds()
+    quest_transitions = load_quest_transitions()
     
     # Insert each NPC's data into DynamoDB
     for character_id, data in npc_data.items():
@@ -65,6 +79,9 @@ def initialize_npc_table(table_name: str, profile_name: str = 'default', region:
             if 'inventory' in data:
                 item['inventory'] = data['inventory']
 
+            if character_id in quest_transitions:
+                item['quest_transitions'] = quest_transitions[character_id]
+
             # Store in DynamoDB
             table.put_item(Item=item)
             print(f"Successfully initialized {character_id}")
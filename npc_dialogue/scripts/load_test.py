@@ -0,0 +1,310 @@
+"""
+Load Test Script for NPC Dialogue Endpoint
+Simulates many concurrent players against the API and reports latency and error rates
+
+Profiles:
+- ramp: players increase linearly from --start-users to --users over --duration
+- step: --step-users more players join every --step-interval seconds, up to --users
+- soak: --users players for the whole --duration
+
+Payloads are built from the test script's TEST_PAYLOAD, or replayed from
+recorded logs (see test_dialogue_endpoint.py) with --replay.
+"""
+
+import asyncio
+import glob
+import json
+import os
+import random
+import sys
+import time
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+import aiohttp
+
+from test_dialogue_endpoint import API_CONFIG, TEST_PAYLOAD
+
+LOCAL_URL = "http://localhost:8000/"
+
+# Latency histogram bucket upper bounds in milliseconds
+HISTOGRAM_BUCKETS = [100, 250, 500, 1000, 2000, 3000, 5000, 10000, 20000, 29000, 30000]
+
+PLAYER_MESSAGES = [
+    "Good evening. I'm looking for a ship and crew.",
+    "What do you know about the treasure on this island?",
+    "I have some meat to trade, are you interested?",
+    "Have you heard any rumours around the port lately?",
+    "Where can I find the smugglers?",
+]
+
+
+def load_characters(path: str = 'data/npc_backgrounds.json') -> List[str]:
+    """Load the NPC ids to talk to, falling back to the test payload's character"""
+    try:
+        with open(path, 'r') as f:
+            return list(json.load(f).keys())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return [TEST_PAYLOAD['character_id']]
+
+
+def load_replay_payloads(pattern: str) -> List[Dict]:
+    """
+    Load recorded request payloads from log files
+
+    Accepts logs written by test_dialogue_endpoint.py ({"request": ..., "response": ...})
+    as well as plain payload files.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.json')
+
+    payloads = []
+    for filename in sorted(glob.glob(pattern)):
+        try:
+            with open(filename, 'r') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Skipping {filename}: {str(e)}")
+            continue
+        payload = data.get('request', data) if isinstance(data, dict) else None
+        if isinstance(payload, dict) and 'player_message' in payload:
+            payloads.append(payload)
+    return payloads
+
+
+class PayloadSource:
+    """Hands out request payloads for simulated players"""
+
+    def __init__(self, run_id: str, replay: Optional[List[Dict]] = None):
+        self.run_id = run_id
+        self.replay = replay
+        self.replay_position = 0
+        self.characters = load_characters()
+
+    def next_payload(self, player: int) -> Dict:
+        if self.replay:
+            payload = dict(self.replay[self.replay_position % len(self.replay)])
+            self.replay_position += 1
+        else:
+            payload = json.loads(json.dumps(TEST_PAYLOAD))
+            payload['character_id'] = random.choice(self.characters)
+            payload['player_message'] = random.choice(PLAYER_MESSAGES)
+        # Each simulated player gets its own game so histories don't collide
+        payload['game_id'] = f"loadtest_{self.run_id}_{player:04d}"
+        return payload
+
+
+class Stats:
+    """Collects per-request results"""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.ok = 0
+        self.errors = 0
+        self.throttled = 0
+        self.status_counts: Dict[str, int] = {}
+        self.per_second: Dict[int, int] = {}
+        self.started = time.monotonic()
+
+    def record(self, latency_ms: float, outcome: str, status: str):
+        self.latencies_ms.append(latency_ms)
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if outcome == 'ok':
+            self.ok += 1
+        elif outcome == 'throttled':
+            self.throttled += 1
+        else:
+            self.errors += 1
+        second = int(time.monotonic() - self.started)
+        self.per_second[second] = self.per_second.get(second, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict:
+        latencies = sorted(self.latencies_ms)
+        total = len(latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(total - 1, int(p / 100 * total))], 1)
+
+        histogram = {}
+        lower = 0
+        for bound in HISTOGRAM_BUCKETS + [float('inf')]:
+            label = f"<{bound}ms" if bound != float('inf') else f">={HISTOGRAM_BUCKETS[-1]}ms"
+            histogram[label] = sum(1 for latency in latencies if lower <= latency < bound)
+            lower = bound
+
+        return {
+            'requests': total,
+            'duration_s': round(elapsed, 1),
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'ok': self.ok,
+            'error_rate': round(self.errors / total, 4) if total else 0.0,
+            'throttle_rate': round(self.throttled / total, 4) if total else 0.0,
+            'latency_ms': {
+                'min': round(latencies[0], 1) if latencies else 0.0,
+                'p50': percentile(50),
+                'p90': percentile(90),
+                'p95': percentile(95),
+                'p99': percentile(99),
+                'max': round(latencies[-1], 1) if latencies else 0.0
+            },
+            'histogram': histogram,
+            'status_counts': self.status_counts,
+            'requests_per_second': [self.per_second.get(s, 0) for s in range(int(elapsed) + 1)]
+        }
+
+
+def classify(status: int, body: str) -> str:
+    """Classify a response as ok, throttled or error"""
+    if status == 429:
+        return 'throttled'
+    if status >= 400:
+        return 'error'
+    # Legacy handler responses carry the real status code inside the body
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return 'ok'
+    if isinstance(data, dict) and isinstance(data.get('statusCode'), int):
+        if data['statusCode'] == 429:
+            return 'throttled'
+        if data['statusCode'] >= 400:
+            return 'error'
+    return 'ok'
+
+
+def target_users(args, elapsed: float) -> int:
+    """Number of players that should be active at this point of the run"""
+    if args.profile == 'soak':
+        return args.users
+    if args.profile == 'ramp':
+        progress = min(1.0, elapsed / args.duration)
+        return round(args.start_users + (args.users - args.start_users) * progress)
+    steps = int(elapsed // args.step_interval)
+    return min(args.users, args.start_users + steps * args.step_users)
+
+
+async def send_request(session: aiohttp.ClientSession, endpoint: str, payload: Dict,
+                       stats: Stats):
+    started = time.monotonic()
+    try:
+        async with session.post(endpoint, json=payload) as response:
+            body = await response.text()
+            outcome = classify(response.status, body)
+            status = str(response.status)
+    except asyncio.TimeoutError:
+        outcome, status = 'error', 'timeout'
+    except aiohttp.ClientError as e:
+        outcome, status = 'error', type(e).__name__
+    stats.record((time.monotonic() - started) * 1000, outcome, status)
+
+
+async def player(index: int, args, session: aiohttp.ClientSession, endpoint: str,
+                 payloads: PayloadSource, stats: Stats, deadline: float, active: List[int]):
+    """One simulated player: talk, think, repeat while this player is scheduled"""
+    # Spread the first requests out instead of firing them all at once
+    await asyncio.sleep(random.uniform(0, args.think_time))
+    while time.monotonic() < deadline and index < active[0]:
+        await send_request(session, endpoint, payloads.next_payload(index), stats)
+        await asyncio.sleep(random.uniform(0.5, 1.5) * args.think_time)
+
+
+async def run(args) -> Dict:
+    base_url = LOCAL_URL if args.local else args.url
+    endpoint = urljoin(base_url.rstrip('/') + '/', 'generate-dialogue')
+    headers = {"Content-Type": "application/json"}
+    if not args.local:
+        headers["x-api-key"] = args.api_key
+
+    replay = None
+    if args.replay:
+        replay = load_replay_payloads(args.replay)
+        if not replay:
+            print(f"Error: No replayable payloads found in {args.replay}")
+            sys.exit(1)
+        print(f"Replaying {len(replay)} recorded payloads")
+
+    payloads = PayloadSource(datetime.now().strftime("%Y%m%d%H%M%S"), replay)
+    stats = Stats()
+    started = time.monotonic()
+    deadline = started + args.duration
+    active = [0]
+    players: Dict[int, asyncio.Task] = {}
+
+    print(f"Target: {endpoint}")
+    print(f"Profile: {args.profile}, up to {args.users} players for {args.duration}s")
+
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(headers=headers, timeout=timeout,
+                                     connector=connector) as session:
+        while time.monotonic() < deadline:
+            elapsed = time.monotonic() - started
+            # Players beyond the target stop after their current request
+            active[0] = target_users(args, elapsed)
+            for index in range(active[0]):
+                if index not in players or players[index].done():
+                    players[index] = asyncio.create_task(
+                        player(index, args, session, endpoint, payloads, stats, deadline, active)
+                    )
+            print(f"\r[{int(elapsed):4d}s] players: {active[0]:4d}  requests: "
+                  f"{len(stats.latencies_ms):6d}  errors: {stats.errors:4d}  "
+                  f"throttled: {stats.throttled:4d}", end='', flush=True)
+            await asyncio.sleep(1)
+        print()
+        await asyncio.gather(*players.values(), return_exceptions=True)
+
+    return stats.summary(time.monotonic() - started)
+
+
+def print_summary(summary: Dict):
+    print("\nLoad Test Results:")
+    print("-" * 50)
+    print(f"Requests: {summary['requests']} in {summary['duration_s']}s "
+          f"({summary['throughput_rps']} req/s)")
+    print(f"Error rate: {summary['error_rate']:.2%}  Throttle rate: {summary['throttle_rate']:.2%}")
+    print(f"Latency (ms): {json.dumps(summary['latency_ms'])}")
+    print(f"Status codes: {json.dumps(summary['status_counts'])}")
+
+    print("\nLatency Histogram:")
+    largest = max(summary['histogram'].values()) or 1
+    for label, count in summary['histogram'].items():
+        print(f"{label:>10} | {'#' * round(40 * count / largest):<40} {count}")
+    print("-" * 50)
+
+
+def save_summary(summary: Dict, args) -> str:
+    """Save results to a log file"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"logs/loadtest_{args.profile}_{timestamp}.json"
+    os.makedirs("logs", exist_ok=True)
+    with open(filename, 'w') as f:
+        json.dump({'settings': vars(args), 'results': summary}, f, indent=2)
+    return filename
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test the NPC dialogue API')
+    parser.add_argument('--profile', choices=['ramp', 'step', 'soak'], default='ramp',
+                        help='Load profile')
+    parser.add_argument('--users', type=int, default=20, help='Maximum concurrent players')
+    parser.add_argument('--start-users', type=int, default=1, help='Players at the start (ramp/step)')
+    parser.add_argument('--step-users', type=int, default=5, help='Players added per step')
+    parser.add_argument('--step-interval', type=float, default=30, help='Seconds between steps')
+    parser.add_argument('--duration', type=float, default=120, help='Test duration in seconds')
+    parser.add_argument('--think-time', type=float, default=2.0,
+                        help='Average seconds a player waits between messages')
+    parser.add_argument('--timeout', type=float, default=35.0, help='Request timeout in seconds')
+    parser.add_argument('--replay', help='Directory or glob of recorded payload logs, e.g. logs/')
+    parser.add_argument('--local', action='store_true', help=f'Target the local server ({LOCAL_URL})')
+    parser.add_argument('--url', default=API_CONFIG['url'], help='API base URL')
+    parser.add_argument('--api-key', default=API_CONFIG['api_key'], help='API key')
+
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print_summary(summary)
+    print(f"\nResults saved to: {save_summary(summary, args)}")
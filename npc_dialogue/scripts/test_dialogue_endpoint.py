@@ -39,17 +39,17 @@ TEST_PAYLOAD = {
     }
 }
 
-def save_response(response_data: Dict, character_id: str):
-    """Save response to a log file"""
+def save_response(response_data: Dict, payload: Dict):
+    """Save request and response to a log file (replayable with load_test.py --replay)"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"logs/dialogue_{character_id}_{timestamp}.json"
+    filename = f"logs/dialogue_{payload['character_id']}_{timestamp}.json"
     
     # Ensure logs directory exists
     import os
     os.makedirs("logs", exist_ok=True)
     
     with open(filename, 'w') as f:
-        json.dump(response_data, f, indent=2)
+        json.dump({"request": payload, "response": response_data}, f, indent=2)
     print(f"\nResponse saved to: {filename}")
 
 def test_dialogue(payload: Dict = None):
@@ -95,7 +95,7 @@ def test_dialogue(payload: Dict = None):
             response_data = response.json()
             print("\nNPC Response:")
             print("-" * 50)
-            print(json.loads(response_data['body'])['dialogue'])
+            print(response_data['dialogue'])
             print("-" * 50)
             
             if 'game_state' in response_data:
@@ -107,7 +107,7 @@ def test_dialogue(payload: Dict = None):
                 print(json.dumps(response_data['state_changes'], indent=2))
             
             # Save response to file
-            save_response(response_data, payload['character_id'])
+            save_response(response_data, payload)
             
         else:
             print(f"Error Response: {response.text}")